@@ -1,15 +1,23 @@
 import streamlit as st
-import time
+import asyncio
 import os
+import hashlib
+import math
+import queue
+import threading
+from collections import deque
+from functools import partial
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
 
 # 导入核心模块
+# 分析 / 组合分析 / Word 生成模块较重 (FAISS、PyMuPDF、python-docx)，在首次使用时再导入
 from core.search import PolicySearcher
-from core.analyzer import PolicyAnalyzer
-from core.document_gen import ReportGenerator
 from core.router_agent import RouterAgent, Intent, ParsedIntent
-from core.compare_agent import CompareAgent
 from core.ranking_v2 import HybridRanker
 from core.summary_agent import SummaryAgent
+from core import http_client
+from core.cache import LRUCache
 
 # 页面配置
 st.set_page_config(
@@ -18,56 +26,183 @@ st.set_page_config(
     layout="wide"
 )
 
-# --- 易方达品牌配色 ---
-EFUND_BLUE = "#004e9d"
+# --- Agent 单例 (进程级共享，跨会话复用客户端与连接池) ---
+@st.cache_resource
+def get_router():
+    return RouterAgent()
 
-st.markdown(f"""
+@st.cache_resource
+def get_ranker():
+    return HybridRanker()
+
+@st.cache_resource
+def get_summary_agent():
+    return SummaryAgent()
+
+@st.cache_resource
+def get_analyzer():
+    from core.analyzer import policy_analyzer
+    return policy_analyzer
+
+@st.cache_resource
+def get_compare_agent():
+    from core.compare_agent import CompareAgent
+    return CompareAgent()
+
+# --- 连接预热 (每个进程只执行一次，后台线程进行，不阻塞首屏) ---
+@st.cache_resource
+def _start_warmup():
+    return http_client.start_warmup()
+
+_start_warmup()
+
+# 检索结果每页条数
+RESULTS_PAGE_SIZE = 5
+# 会话内保留的对话消息上限
+MAX_CHAT_HISTORY = 50
+# 会话内保留的检索结果缓存条数 (LRU 淘汰)
+MAX_SEARCH_CACHE = 64
+# 会话内检索结果缓存的有效期 (秒)，过期后重新联网检索
+SEARCH_CACHE_TTL = 24 * 3600
+# 强制刷新检索指令前缀 (跳过意图解析与所有检索缓存)
+FORCE_REFRESH_PREFIX = "强制刷新检索:"
+# 关键词提取超时 (秒)，超时后直接用原始查询检索
+KEYWORD_EXTRACT_TIMEOUT = 10
+# 重排完成前先行展示的启发式预览条数
+RANK_PREVIEW_SIZE = 5
+
+# --- 检索结果缓存 ---
+# 与 _cached_search 的缓存有效期一致 (秒)
+SEARCH_RESULT_TTL = 3600
+
+@st.cache_resource
+def _searched_raw_queries():
+    """
+    近期已经联网执行过双路召回的原始查询 (进程级，与 _cached_search 同有效期)；
+    再次检索同一原始查询时 _cached_search 通常直接命中，无需提前预取原始查询结果
+    """
+    return LRUCache(maxsize=256, ttl=SEARCH_RESULT_TTL), threading.Lock()
+
+def _raw_query_recently_searched(raw_query: str) -> bool:
+    seen, lock = _searched_raw_queries()
+    with lock:
+        return raw_query in seen
+
+@st.cache_data(ttl=SEARCH_RESULT_TTL, max_entries=256, show_spinner=False)
+def _cached_search(query: str, source_preference: str = "all", time_range=None, raw_query=None):
+    """相同检索参数一小时内直接复用结果，避免重复联网"""
+    if raw_query:
+        seen, lock = _searched_raw_queries()
+        with lock:
+            seen.put(raw_query, True)
+    return PolicySearcher.search(
+        query,
+        source_preference=source_preference,
+        time_range=time_range,
+        raw_query=raw_query
+    )
+
+@st.cache_data(ttl=3600, max_entries=256, show_spinner=False)
+def _cached_rank(results, query: str, temperature: float = 0.0):
+    """相同候选集 + 查询词的重排结果直接复用，跳过 LLM 精判"""
+    return get_ranker().rank(results, query, temperature=temperature)
+
+def _search_cache_key(query: str) -> str:
+    """检索缓存键：转小写、按空白分词后排序 (词序无关)，再取 blake2b 短摘要"""
+    normalized = " ".join(sorted(query.lower().split()))
+    return hashlib.blake2b(normalized.encode(), digest_size=8).hexdigest()
+
+# --- 检索结果展示文本 ---
+CACHED_TAG_HTML = '<span class="cached-tag">已暂存</span>'
+
+def _add_display_fields(results: list) -> list:
+    """每次检索只拼接一次结果卡片的展示文本，写回结果字典 (_display_* 字段)，渲染时直接复用"""
+    for idx, r in enumerate(results):
+        meta_parts = []
+        if r.get('date'):
+            meta_parts.append(f"📅 {r['date']}")
+        if r.get('source'):
+            meta_parts.append(f"🏛️ {r['source']}")
+        if r.get('status'):
+            meta_parts.append(f"🟢 **{r['status']}**")
+        if r.get('tag'):
+            meta_parts.append(f"🏷️ `{r['tag']}`")
+        link_html = f'<a href="{r["link"]}" target="_blank" class="source-link">🔗 查看原文</a>'
+        
+        title = f"**{idx+1}. {r['title']}**"
+        meta = " | ".join(meta_parts + [link_html])
+        meta_cached = " | ".join(meta_parts + [CACHED_TAG_HTML, link_html])
+        # 完整原文摘要 (保持真实3行)
+        snippet = f'<div class="snippet-text">{r.get("snippet", "")}</div>'
+        
+        r['_display_card'] = f"{title}\n\n{meta}\n\n{snippet}"
+        r['_display_card_cached'] = f"{title}\n\n{meta_cached}\n\n{snippet}"
+        # 暂存池条目的标题与删除按钮 key 同样只算一次 (暂存项均来自检索结果)
+        r['_cart_label'] = f"{r['title'][:25]}..."
+        r['_cart_key'] = f"remove_{hashlib.md5(r['link'].encode()).hexdigest()[:12]}"
+    return results
+
+# --- 静态资源 ---
+# 相对脚本目录定位，不依赖启动时的工作目录
+LOGO_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets", "efund_logo.png")
+
+@st.cache_resource
+def _logo_bytes():
+    """Logo 只读盘一次；文件不存在时返回 None"""
+    if not os.path.exists(LOGO_PATH):
+        return None
+    with open(LOGO_PATH, "rb") as f:
+        return f.read()
+
+# --- 易方达品牌配色 (品牌蓝 #004e9d) ---
+# 普通字符串常量：无需在每次 rerun 时做 f-string 格式化
+_CSS = """
     <style>
     /* 全局按钮样式 */
-    div.stButton > button {{
-        background-color: {EFUND_BLUE} !important;
+    div.stButton > button {
+        background-color: #004e9d !important;
         color: white !important;
         border-radius: 8px;
         border: none;
         padding: 0.5rem 1rem;
         transition: all 0.3s;
-    }}
-    div.stButton > button:hover {{
+    }
+    div.stButton > button:hover {
         background-color: #003a75 !important;
         box-shadow: 0 4px 8px rgba(0,0,0,0.1);
-    }}
+    }
     
     /* 聊天消息样式 */
-    .user-message {{
+    .user-message {
         background-color: #e3f2fd;
         padding: 12px 16px;
         border-radius: 12px;
         margin: 8px 0;
-        border-left: 4px solid {EFUND_BLUE};
-    }}
-    .agent-message {{
+        border-left: 4px solid #004e9d;
+    }
+    .agent-message {
         background-color: #f5f5f5;
         padding: 12px 16px;
         border-radius: 12px;
         margin: 8px 0;
         border-left: 4px solid #28a745;
-    }}
+    }
     
     /* 政策卡片样式 */
-    .policy-card {{
+    .policy-card {
         background: white;
         border: 1px solid #e0e0e0;
         border-radius: 8px;
         padding: 12px;
         margin: 8px 0;
         transition: all 0.2s;
-    }}
-    .policy-card:hover {{
+    }
+    .policy-card:hover {
         box-shadow: 0 2px 8px rgba(0,0,0,0.1);
-    }}
+    }
     
     /* 暂存标签样式 */
-    .cached-tag {{
+    .cached-tag {
         display: inline-block;
         background-color: #28a745;
         color: white;
@@ -75,66 +210,66 @@ st.markdown(f"""
         border-radius: 4px;
         font-size: 12px;
         margin-left: 8px;
-    }}
+    }
     
-    .section-header {{
+    .section-header {
         font-size: 1.1rem;
         font-weight: bold;
         color: #004e9d;
         margin-top: 1rem;
         margin-bottom: 0.5rem;
-    }}
+    }
 
     /* 搜索结果摘要样式 */
-    .snippet-text {{
+    .snippet-text {
         color: #555;
         font-size: 0.9rem;
         line-height: 1.6;
         margin-top: 6px;
         min-height: 4.2em; /* 确保至少3行空间 */
-    }}
+    }
     
-    .source-link {{
+    .source-link {
         color: #004e9d;
         text-decoration: none;
         font-size: 0.85rem;
         margin-left: 10px;
-    }}
-    .source-link:hover {{
+    }
+    .source-link:hover {
         text-decoration: underline;
-    }}
+    }
     
     /* 浅色模式优化 */
-    @media (prefers-color-scheme: light) {{
-        .stMarkdown, .stText, p, span, li {{
+    @media (prefers-color-scheme: light) {
+        .stMarkdown, .stText, p, span, li {
             color: #262730 !important;
-        }}
-    }}
+        }
+    }
     
     /* 深色模式适配 */
-    @media (prefers-color-scheme: dark) {{
-        h1, h2, h3 {{
+    @media (prefers-color-scheme: dark) {
+        h1, h2, h3 {
             color: #4da3ff !important;
-        }}
-        .stMarkdown {{
+        }
+        .stMarkdown {
             color: #e0e0e0;
-        }}
-        .user-message {{
+        }
+        .user-message {
             background-color: #1e3a5f;
             color: white;
-        }}
-        .agent-message {{
+        }
+        .agent-message {
             background-color: #2d2d2d;
             color: #e0e0e0;
-        }}
-        .policy-card {{
+        }
+        .policy-card {
             background: #1e1e1e;
             border-color: #444;
-        }}
-    }}
+        }
+    }
 
     /* 粘性底部容器 (进度条 + 输入框) */
-    .sticky-bottom {{
+    .sticky-bottom {
         position: fixed;
         bottom: 0;
         left: 0;
@@ -143,23 +278,23 @@ st.markdown(f"""
         padding: 10px 20px;
         z-index: 999;
         border-top: 1px solid #eee;
-    }}
+    }
     </style>
-    """, unsafe_allow_html=True)
+    """
+
+st.markdown(_CSS, unsafe_allow_html=True)
 
 # --- Session State 初始化 ---
 if 'messages' not in st.session_state:
-    st.session_state.messages = []
+    st.session_state.messages = deque(maxlen=MAX_CHAT_HISTORY)  # 只保留最近的对话，超出自动丢弃最旧消息
 if 'search_results' not in st.session_state:
     st.session_state.search_results = []
+if 'results_page' not in st.session_state:
+    st.session_state.results_page = 0  # 检索结果当前页 (从 0 开始)
 if 'policy_cache' not in st.session_state:
-    st.session_state.policy_cache = []  # 暂存池
+    st.session_state.policy_cache = {}  # 暂存池：{link: policy}，保持暂存顺序
 if 'analysis_result' not in st.session_state:
     st.session_state.analysis_result = None
-if 'router' not in st.session_state:
-    st.session_state.router = RouterAgent()
-if 'compare_agent' not in st.session_state:
-    st.session_state.compare_agent = CompareAgent()
 if 'analysis_direction' not in st.session_state:
     st.session_state.analysis_direction = None
 if 'trigger_compare' not in st.session_state:
@@ -169,47 +304,81 @@ if 'trigger_single_analysis' not in st.session_state:
 if "current_snippet" not in st.session_state:
     st.session_state.current_snippet = None
 if 'search_cache' not in st.session_state:
-    st.session_state.search_cache = {}  # 搜索结果缓存：{query: results}
+    st.session_state.search_cache = LRUCache(maxsize=MAX_SEARCH_CACHE, ttl=SEARCH_CACHE_TTL)  # 搜索结果缓存：{查询摘要: results}，LRU + TTL
 if 'current_raw_query' not in st.session_state:
     st.session_state.current_raw_query = None
 if 'is_result_from_cache' not in st.session_state:
     st.session_state.is_result_from_cache = False
+if 'executor' not in st.session_state:
+    st.session_state.executor = ThreadPoolExecutor(max_workers=2)  # 后台分析线程池
+if 'analysis_future' not in st.session_state:
+    st.session_state.analysis_future = None
+if 'pending_cart_removals' not in st.session_state:
+    st.session_state.pending_cart_removals = set()  # 暂存池待删除的链接
 
 # --- 侧边栏 ---
+def _mark_cart_removal(link: str):
+    """删除按钮回调：只登记待删除的链接，由暂存池片段在渲染前统一清理"""
+    st.session_state.pending_cart_removals.add(link)
+
+@st.fragment
+def _render_policy_cart():
+    """
+    侧边栏暂存池：删除/清空只重跑本片段，不重新执行整页脚本；
+    仅当改动影响当前检索结果的“已暂存”标记，或需要触发组合分析时才整页刷新
+    """
+    shown_links = {r['link'] for r in st.session_state.search_results}
+    
+    # 统一清理本轮登记的删除项 (回调先于渲染执行，列表一次即可画对)
+    pending = st.session_state.pending_cart_removals
+    if pending:
+        cache = st.session_state.policy_cache
+        for link in pending:
+            cache.pop(link, None)
+        affects_results = not shown_links.isdisjoint(pending)
+        pending.clear()
+        if affects_results:
+            st.rerun()
+    
+    st.subheader("📌 暂存池")
+    if not st.session_state.policy_cache:
+        st.caption("暂无暂存政策")
+        st.caption("💡 搜索后点击[暂存]或用自然语言选择")
+        return
+    
+    for i, (link, p) in enumerate(st.session_state.policy_cache.items()):
+        col1, col2 = st.columns([4, 1])
+        with col1:
+            st.write(f"{i+1}. {p['_cart_label']}")
+        with col2:
+            # 以链接哈希作为控件 key，删除其他条目后按钮身份保持不变
+            st.button("✕", key=p['_cart_key'], on_click=_mark_cart_removal, args=(link,))
+    
+    st.divider()
+    col1, col2 = st.columns(2)
+    with col1:
+        if st.button("🔍 组合分析", use_container_width=True):
+            st.session_state.trigger_compare = True
+            st.rerun()
+    with col2:
+        if st.button("🗑️ 清空", use_container_width=True):
+            cleared_links = st.session_state.policy_cache.keys()
+            affects_results = not shown_links.isdisjoint(cleared_links)
+            st.session_state.policy_cache = {}
+            st.rerun(scope="app" if affects_results else "fragment")
+
 with st.sidebar:
-    logo_path = "assets/efund_logo.png"
-    if os.path.exists(logo_path):
-        st.image(logo_path, width=180)
+    logo_bytes = _logo_bytes()
+    if logo_bytes:
+        st.image(logo_bytes, width=180)
     else:
         st.markdown("### 📊 EFund")
     
     st.divider()
     st.info("🤖 Phase 2: 对话式政策分析")
     
-    # 暂存池展示
-    st.subheader("📌 暂存池")
-    if st.session_state.policy_cache:
-        for i, p in enumerate(st.session_state.policy_cache):
-            col1, col2 = st.columns([4, 1])
-            with col1:
-                st.write(f"{i+1}. {p['title'][:25]}...")
-            with col2:
-                if st.button("✕", key=f"remove_{i}"):
-                    st.session_state.policy_cache.pop(i)
-                    st.rerun()
-        
-        st.divider()
-        col1, col2 = st.columns(2)
-        with col1:
-            if st.button("🔍 组合分析", use_container_width=True):
-                st.session_state.trigger_compare = True
-        with col2:
-            if st.button("🗑️ 清空", use_container_width=True):
-                st.session_state.policy_cache = []
-                st.rerun()
-    else:
-        st.caption("暂无暂存政策")
-        st.caption("💡 搜索后点击[暂存]或用自然语言选择")
+    # 暂存池展示 (局部刷新)
+    _render_policy_cart()
 
 # --- 主界面 ---
 st.title("📜 政策检索分析 Agent")
@@ -220,14 +389,61 @@ st.divider()
 chat_container = st.container()
 with chat_container:
     # 只展示最后2条消息，避免界面冗余
-    recent_messages = st.session_state.messages[-2:] if len(st.session_state.messages) > 2 else st.session_state.messages
-    for msg in recent_messages:
-        if msg["role"] == "user":
-            st.markdown(f'<div class="user-message">👤 {msg["content"]}</div>', unsafe_allow_html=True)
-        else:
-            st.markdown(f'<div class="agent-message">🤖 {msg["content"]}</div>', unsafe_allow_html=True)
+    messages = st.session_state.messages
+    recent_messages = list(islice(messages, max(0, len(messages) - 2), None))
+    if recent_messages:
+        # 拼接为一段 HTML，一次渲染调用
+        st.markdown("".join(
+            f'<div class="user-message">👤 {msg["content"]}</div>' if msg["role"] == "user"
+            else f'<div class="agent-message">🤖 {msg["content"]}</div>'
+            for msg in recent_messages
+        ), unsafe_allow_html=True)
 
 # --- 搜索结果展示区 ---
+@st.fragment
+def _render_result_page():
+    """当前页检索结果：翻页只重跑本片段；暂存/分析会影响侧边栏与分析任务，仍整页刷新"""
+    # 分页渲染：每次 rerun 只序列化当前页的控件，编号保持全局序号以便“存1 2”等指令引用
+    shown_results = st.session_state.search_results
+    page_count = math.ceil(len(shown_results) / RESULTS_PAGE_SIZE)
+    page = min(st.session_state.results_page, page_count - 1)
+    start = page * RESULTS_PAGE_SIZE
+    
+    for idx, r in enumerate(shown_results[start:start + RESULTS_PAGE_SIZE], start=start):
+        is_cached = r['link'] in st.session_state.policy_cache  # 以 link 为键，O(1) 判断
+        
+        with st.container():
+            col1, col2 = st.columns([6, 1])
+            with col1:
+                # 标题 + 元信息行 (日期、机构、链接) + 原文摘要，合并为一次渲染；只有“已暂存”标签随交互变化
+                st.markdown(r['_display_card_cached'] if is_cached else r['_display_card'], unsafe_allow_html=True)
+            
+            with col2:
+                if not is_cached:
+                    if st.button("📌 暂存", key=f"cache_{idx}", use_container_width=True):
+                        st.session_state.policy_cache[r['link']] = r
+                        st.rerun()
+                
+                if st.button("🔍 分析", key=f"analyze_{idx}", use_container_width=True):
+                    st.session_state.selected_for_analysis = r
+                    st.session_state.trigger_single_analysis = True
+                    st.rerun()
+            st.divider()
+    
+    if page_count > 1:
+        def _goto_page(p):
+            st.session_state.results_page = p
+        
+        col_prev, col_info, col_next = st.columns([1, 4, 1])
+        with col_prev:
+            st.button("◀ 上一页", key="page_prev", disabled=page == 0, use_container_width=True,
+                      on_click=_goto_page, args=(page - 1,))
+        with col_info:
+            st.caption(f"第 {page + 1} / {page_count} 页 · 共 {len(shown_results)} 条")
+        with col_next:
+            st.button("下一页 ▶", key="page_next", disabled=page >= page_count - 1, use_container_width=True,
+                      on_click=_goto_page, args=(page + 1,))
+
 if st.session_state.search_results:
     col_h1, col_h2 = st.columns([5, 1])
     with col_h1:
@@ -240,10 +456,9 @@ if st.session_state.search_results:
             if st.button("🔄 重新检索", use_container_width=True, help="清除当前搜索缓存并尝试生成新的结果"):
                 # 清除当前缓存
                 q = st.session_state.current_raw_query
-                if q in st.session_state.search_cache:
-                    del st.session_state.search_cache[q]
+                st.session_state.search_cache.evict(_search_cache_key(q))
                 # 注入一个特殊消息来触发强制检索
-                st.session_state.messages.append({"role": "user", "content": f"强制刷新检索: {q}"})
+                st.session_state.messages.append({"role": "user", "content": f"{FORCE_REFRESH_PREFIX} {q}"})
                 st.rerun()
     st.divider()
     
@@ -252,46 +467,7 @@ if st.session_state.search_results:
         st.info(f"💡 **政策速递 (AI Featured Snippet)**  \n{st.session_state.current_snippet}")
         st.write("")
     
-    for idx, r in enumerate(st.session_state.search_results):
-        is_cached = any(p['link'] == r['link'] for p in st.session_state.policy_cache)
-        
-        # 统一标题格式：标题 + 日期 + 机构
-        full_title = f"{r['title']} [{r.get('date', '未知')}] ({r.get('source', '未知')})"
-        
-        with st.container():
-            col1, col2 = st.columns([6, 1])
-            with col1:
-                st.markdown(f"**{idx+1}. {r['title']}**")
-                
-                # 元信息行（日期、机构、链接）
-                meta_parts = []
-                if r.get('date'):
-                    meta_parts.append(f"📅 {r['date']}")
-                if r.get('source'):
-                    meta_parts.append(f"🏛️ {r['source']}")
-                if r.get('status'):
-                    meta_parts.append(f"🟢 **{r['status']}**")
-                if r.get('tag'):
-                    meta_parts.append(f"🏷️ `{r['tag']}`")
-                if is_cached:
-                    meta_parts.append('<span class="cached-tag">已暂存</span>')
-                meta_parts.append(f'<a href="{r["link"]}" target="_blank" class="source-link">🔗 查看原文</a>')
-                st.markdown(" | ".join(meta_parts), unsafe_allow_html=True)
-                
-                # 完整原文摘要 (保持真实3行)
-                st.markdown(f'<div class="snippet-text">{r.get("snippet", "")}</div>', unsafe_allow_html=True)
-            
-            with col2:
-                if not is_cached:
-                    if st.button("📌 暂存", key=f"cache_{idx}", use_container_width=True):
-                        st.session_state.policy_cache.append(r)
-                        st.rerun()
-                
-                if st.button("🔍 分析", key=f"analyze_{idx}", use_container_width=True):
-                    st.session_state.selected_for_analysis = r
-                    st.session_state.trigger_single_analysis = True
-                    st.rerun()
-            st.divider()
+    _render_result_page()
 
 # --- 分析结果展示 ---
 if st.session_state.analysis_result:
@@ -308,8 +484,9 @@ if st.session_state.analysis_result:
     # 报告下载
     col1, col2 = st.columns([3, 1])
     with col2:
-        report_file = "EFund_Policy_Report.docx"
-        ReportGenerator.generate_docx(res, report_file)
+        # 同一分析结果只生成一次 docx (进程级 LRU，跨会话共享；通常已由后台分析任务预生成)
+        from core.document_gen import ReportGenerator
+        docx_bytes = ReportGenerator.generate_docx_bytes(res)
         
         # 处理文件名
         p_info = res.get('selected_policy', {})
@@ -319,14 +496,14 @@ if st.session_state.analysis_result:
         else:
             fn = f"组合分析报告_{len(pa_list)}份.docx"
             
-        with open(report_file, "rb") as file:
-            st.download_button(
-                label="📥 下载word报告",
-                data=file,
-                file_name=fn,
-                mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-                use_container_width=True
-            )
+        st.download_button(
+            label="📥 下载word报告",
+            data=docx_bytes,
+            file_name=fn,
+            mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+            on_click="ignore",  # 下载不改变任何状态，无需触发 rerun
+            use_container_width=True
+        )
         
         # 新增：原始 PDF 下载链接
         pdf_url = res.get('pdf_download_url')
@@ -385,6 +562,177 @@ if st.session_state.analysis_result:
 # 将进度条放置在最下方，紧邻输入框
 progress_container = st.container()
 
+# --- 意图处理 ---
+# 每个处理函数返回一条助手回复 (None 表示无需回复)，由输入区统一写入对话
+
+async def _extract_with_prefetch(query: str, temperature: float = 0.0, prefetch: bool = True) -> dict:
+    """
+    关键词提取 (LLM) 与原始查询召回 (SerpApi) 互不依赖，并发执行 (prefetch=False 时只做提取)；
+    提取超时或失败时降级为直接使用原始查询
+    """
+    extract = asyncio.wait_for(
+        get_router().aextract_keywords(query, temperature=temperature),
+        timeout=KEYWORD_EXTRACT_TIMEOUT
+    )
+    tasks = [extract, PolicySearcher.aprefetch(query)] if prefetch else [extract]
+    search_params = (await asyncio.gather(*tasks, return_exceptions=True))[0]
+    if isinstance(search_params, BaseException):
+        print(f"⚠️ 关键词提取超时或失败，使用原始查询: {search_params!r}")
+        search_params = {"refined_query": query, "source_preference": "all", "time_range": None}
+    return search_params
+
+def _rank_with_preview(rank_fn, results: list, query: str, temperature: float = 0.0) -> list:
+    """LLM 精判耗时较长：先按启发式分数展示前几条预览，重排完成后清除"""
+    preview_ph = st.empty()
+    preview = get_ranker().preview(results, query, top_k=RANK_PREVIEW_SIZE)
+    if preview:
+        preview_ph.markdown("\n".join(
+            ["**初步结果预览** (精判中，排序可能变化)："] +
+            [f"{i}. [{p.get('title', '')}]({p.get('link', '')}) · {p.get('source', '')}" for i, p in enumerate(preview, 1)]
+        ))
+    try:
+        return rank_fn(results, query, temperature=temperature)
+    finally:
+        preview_ph.empty()
+
+def _run_search(query: str, temperature: float = 0.0, force_refresh: bool = False) -> list:
+    """检索主流程：关键词提取 → 双路召回 → 重排 → (空结果时放宽重试)，并生成政策速递"""
+    with progress_container.status("🔍 正在开启 V4.0 智能投研搜索...", expanded=True) as status:
+        # 预取只在结果缓存大概率未命中时进行 (否则白白消耗一次 SerpApi 调用)；
+        # 强制刷新时由 search 一并重新召回两路查询，也不单独预取
+        prefetch = not force_refresh and not _raw_query_recently_searched(query)
+        st.write("📡 提取意图与分词 (同时预取原始查询结果)..." if prefetch else "📡 提取意图与分词...")
+        search_params = http_client.run_sync(_extract_with_prefetch(query, temperature, prefetch=prefetch))
+        
+        # 强制刷新时绕过所有缓存 (含 SerpApi 响应记忆)，重新联网检索与重排
+        search_fn = partial(PolicySearcher.search, use_memo=False) if force_refresh else _cached_search
+        rank_fn = get_ranker().rank if force_refresh else _cached_rank
+        
+        st.write(f"🌐 正在执行 Google 双向量混合召回 (Raw + AI-Refined)...")
+        results = search_fn(
+            search_params['refined_query'],
+            source_preference=search_params.get('source_preference', 'all'),
+            time_range=search_params.get('time_range'),
+            raw_query=query # 传入原始指令进行双重检索
+        )
+        
+        st.write("⚖️ 正在执行 AI 深度大图重排与政策原件精判...")
+        results = _rank_with_preview(rank_fn, results, query, temperature)
+        
+        # --- Phase 16: Knowledge Snippet ---
+        if results and len(results) >= 2:
+            st.write("📖 正在生成政策速递 (AI Featured Snippet)...")
+            summary_agent = get_summary_agent()
+            st.session_state.current_snippet = summary_agent.generate_snippet(query, results)
+        else:
+            st.session_state.current_snippet = None
+        
+        # --- 自动补齐逻辑 (如果召回依然为空) ---
+        if not results:
+            st.write("⚠️ 未找到匹配政策，正在尝试放宽搜索限制...")
+            results = search_fn(
+                query,
+                source_preference='all'
+            )
+            results = rank_fn(results, query, temperature=temperature)
+        
+        status.update(label="✅ 智能检索与精判完成！", state="complete", expanded=False)
+    
+    return results
+
+def _show_results(results: list, raw_query: str, from_cache: bool = False):
+    """更新结果区，并把非空的新结果写入会话检索缓存"""
+    st.session_state.search_results = results if from_cache else _add_display_fields(results)
+    st.session_state.results_page = 0
+    st.session_state.is_result_from_cache = from_cache
+    st.session_state.current_raw_query = raw_query
+    if results and not from_cache:
+        st.session_state.search_cache.put(_search_cache_key(raw_query), results)
+
+def _add_to_cache(select_indices) -> list:
+    """按 1-based 序号暂存当前结果中的政策，返回新加入的政策标题"""
+    results = st.session_state.search_results
+    cache = st.session_state.policy_cache
+    # 先按序号取出选中项，再一次性过滤已暂存 (同时去掉重复序号)，整体 O(k)
+    selected = [results[i - 1] for i in select_indices or [] if 1 <= i <= len(results)]
+    new = {p['link']: p for p in selected if p['link'] not in cache}
+    cache.update(new)
+    return [p['title'] for p in new.values()]
+
+def _handle_search(parsed: ParsedIntent, force_refresh: bool = False):
+    raw_query = parsed.search_query.strip()
+    # 缓存键与大小写、多余空白及词序无关，“ETF 新规 2024”与“2024  etf 新规”视为同一查询
+    query_key = _search_cache_key(raw_query)
+    if force_refresh:
+        st.session_state.search_cache.evict(query_key)
+    
+    cached_results = st.session_state.search_cache.get(query_key)
+    if cached_results is not None:
+        _show_results(cached_results, raw_query, from_cache=True)
+        return f"♻️ 已从缓存为您恢复 “{raw_query}” 的精选结果。"
+    
+    # 刷新时：稍微调高温度以增加多样性
+    temp = 0.2 if force_refresh else 0.0
+    results = _run_search(parsed.search_query, temperature=temp, force_refresh=force_refresh)
+    _show_results(results, raw_query)
+    if results:
+        return f"✅ 已为您精选 {len(results)} 条政策，并按投研权威度排序。"
+    return f"❌ 未找到与“{raw_query}”相关的权威政策。建议尝试更简短的关键词。"
+
+def _handle_select_and_continue(parsed: ParsedIntent):
+    # 暂存 + 继续搜索
+    reply = ""
+    if parsed.select_indices and st.session_state.search_results:
+        _add_to_cache(parsed.select_indices)
+        reply = "✅ 已暂存选中的政策。"
+    
+    if parsed.search_query:
+        results = _run_search(parsed.search_query)
+        _show_results(results, parsed.search_query.strip())
+        reply += f"✅ 已根据您的新需求找到 {len(results)} 条相关政策。"
+    return reply or None
+
+def _handle_select_only(parsed: ParsedIntent):
+    # 仅暂存
+    if parsed.select_indices and st.session_state.search_results:
+        added = _add_to_cache(parsed.select_indices)
+        return f"✅ 已暂存: {', '.join(t[:15] for t in added)}..."
+    return None
+
+def _handle_analyze_combined(parsed: ParsedIntent):
+    # 组合分析
+    if len(st.session_state.policy_cache) >= 2:
+        st.session_state.analysis_direction = parsed.analysis_direction
+        st.session_state.trigger_compare = True
+        return None
+    return "❌ 组合分析需要至少2个政策，请先暂存更多政策。"
+
+def _handle_analyze_single(parsed: ParsedIntent):
+    # 单篇分析 (通过自然语言触发)
+    if parsed.select_indices and st.session_state.search_results:
+        idx = parsed.select_indices[0]
+        if 1 <= idx <= len(st.session_state.search_results):
+            st.session_state.selected_for_analysis = st.session_state.search_results[idx - 1]
+            st.session_state.trigger_single_analysis = True
+    return None
+
+def _handle_clear_cache(parsed: ParsedIntent):
+    st.session_state.policy_cache = {}
+    return "✅ 暂存池已清空。"
+
+def _handle_chat(parsed: ParsedIntent):
+    # 普通对话
+    return parsed.message or "我可以帮您检索政策、暂存感兴趣的文件、进行单独或组合分析。请告诉我您的需求。"
+
+INTENT_HANDLERS = {
+    Intent.SEARCH: _handle_search,
+    Intent.SELECT_AND_CONTINUE: _handle_select_and_continue,
+    Intent.SELECT_ONLY: _handle_select_only,
+    Intent.ANALYZE_COMBINED: _handle_analyze_combined,
+    Intent.ANALYZE_SINGLE: _handle_analyze_single,
+    Intent.CLEAR_CACHE: _handle_clear_cache,
+}
+
 # --- 用户输入区 ---
 user_input = st.chat_input("请输入您的问题或指令（如：帮我找2024年减持新规）")
 
@@ -392,250 +740,122 @@ if user_input:
     # 添加用户消息
     st.session_state.messages.append({"role": "user", "content": user_input})
     
-    # 意图解析
-    if user_input.startswith("强制刷新检索:"):
-        parsed = ParsedIntent(intent=Intent.SEARCH, search_query=user_input.replace("强制刷新检索:", "").strip())
+    # 意图解析 + 分发
+    if user_input.startswith(FORCE_REFRESH_PREFIX):
+        parsed = ParsedIntent(intent=Intent.SEARCH, search_query=user_input[len(FORCE_REFRESH_PREFIX):].strip())
+        reply = _handle_search(parsed, force_refresh=True)
     else:
         context = {
             "search_results": st.session_state.search_results,
             "cached_policies": st.session_state.policy_cache
         }
-        parsed = st.session_state.router.parse(user_input, context)
-    
-    # 根据意图执行不同操作
-    if parsed.intent == Intent.SEARCH:
-        # 首先检查缓存
-        raw_query = parsed.search_query.strip()
-        # 处理强制刷新指令
-        is_force_refresh = user_input.startswith("强制刷新检索:")
-        if is_force_refresh:
-            raw_query = user_input.replace("强制刷新检索:", "").strip()
-            if raw_query in st.session_state.search_cache:
-                del st.session_state.search_cache[raw_query]
-
-        if raw_query in st.session_state.search_cache and not is_force_refresh:
-            st.session_state.search_results = st.session_state.search_cache[raw_query]
-            st.session_state.is_result_from_cache = True
-            st.session_state.current_raw_query = raw_query
-            msg = f"♻️ 已从缓存为您恢复 “{raw_query}” 的精选结果。"
-        else:
-            # 进度展示 (在输入框上方)
-            with progress_container.status("🔍 正在开启 V4.0 智能投研搜索...", expanded=True) as status:
-                st.write("📡 提取意图与分词...")
-                # 刷新时：稍微调高温度以增加多样性
-                temp = 0.2 if is_force_refresh else 0.0
-                search_params = st.session_state.router.extract_keywords(parsed.search_query, temperature=temp) 
-                
-                st.write(f"🌐 正在执行 Google 双向量混合召回 (Raw + AI-Refined)...")
-                results = PolicySearcher.search(
-                    search_params['refined_query'],
-                    source_preference=search_params.get('source_preference', 'all'),
-                    time_range=search_params.get('time_range'),
-                    raw_query=parsed.search_query # 传入原始指令进行双重检索
-                )
-                
-                st.write("⚖️ 正在执行 AI 深度大图重排与政策原件精判...")
-                ranker = HybridRanker()
-                results = ranker.rank(results, parsed.search_query, temperature=temp)
-                
-                # --- Phase 16: Knowledge Snippet ---
-                if results and len(results) >= 2:
-                    st.write("📖 正在生成政策速递 (AI Featured Snippet)...")
-                    summary_agent = SummaryAgent()
-                    snippet = summary_agent.generate_snippet(parsed.search_query, results)
-                    st.session_state.current_snippet = snippet
-                else:
-                    st.session_state.current_snippet = None
-                
-                # --- 自动补齐逻辑 (如果召回依然为空) ---
-                if not results:
-                    st.write("⚠️ 未找到匹配政策，正在尝试放宽搜索限制...")
-                    results = PolicySearcher.search(
-                        parsed.search_query,
-                        source_preference='all'
-                    )
-                    results = ranker.rank(results, parsed.search_query, temperature=temp)
-                
-                status.update(label="✅ 智能检索与精判完成！", state="complete", expanded=False)
-            
-            st.session_state.search_results = results
-            st.session_state.is_result_from_cache = False
-            st.session_state.current_raw_query = raw_query
-            
-            # 将结果存入缓存
-            if results:
-                st.session_state.search_cache[raw_query] = results
-                msg = f"✅ 已为您精选 {len(results)} 条政策，并按投研权威度排序。"
-            else:
-                msg = f"❌ 未找到与“{raw_query}”相关的权威政策。建议尝试更简短的关键词。"
-            
-        st.session_state.messages.append({
-            "role": "assistant",
-            "content": msg
-        })
-    
-    elif parsed.intent == Intent.SELECT_AND_CONTINUE:
-        # 暂存 + 继续搜索
-        if parsed.select_indices and st.session_state.search_results:
-            for idx in parsed.select_indices:
-                if 1 <= idx <= len(st.session_state.search_results):
-                    policy = st.session_state.search_results[idx - 1]
-                    if not any(p['link'] == policy['link'] for p in st.session_state.policy_cache):
-                        st.session_state.policy_cache.append(policy)
-            
-            st.session_state.messages.append({
-                "role": "assistant",
-                "content": f"✅ 已暂存选中的政策。正在继续搜索: {parsed.search_query}..."
-            })
-        
-        if parsed.search_query:
-            with progress_container.status(f"🔍 正在继续搜索: {parsed.search_query}...", expanded=True) as status:
-                st.write("📡 提取意图关键词...")
-                search_params = st.session_state.router.extract_keywords(parsed.search_query)
-                
-                st.write(f"🌐 正在检索: {search_params['refined_query']}...")
-                results = PolicySearcher.search(
-                    search_params['refined_query'],
-                    source_preference=search_params.get('source_preference', 'all'),
-                    time_range=search_params.get('time_range')
-                )
-                
-                st.write("⚖️ 正在执行权威度与相关性混合排序...")
-                ranker = HybridRanker()
-                results = ranker.rank(results, parsed.search_query)
-                
-                status.update(label="✅ 搜索更新完成！", state="complete", expanded=False)
-                
-            st.session_state.search_results = results
-            st.session_state.messages.append({
-                "role": "assistant",
-                "content": f"✅ 已根据您的新需求找到 {len(results)} 条相关政策。"
-            })
-    
-    elif parsed.intent == Intent.SELECT_ONLY:
-        # 仅暂存
-        if parsed.select_indices and st.session_state.search_results:
-            added = []
-            for idx in parsed.select_indices:
-                if 1 <= idx <= len(st.session_state.search_results):
-                    policy = st.session_state.search_results[idx - 1]
-                    if not any(p['link'] == policy['link'] for p in st.session_state.policy_cache):
-                        st.session_state.policy_cache.append(policy)
-                        added.append(policy['title'][:15])
-            
-            st.session_state.messages.append({
-                "role": "assistant",
-                "content": f"✅ 已暂存: {', '.join(added)}..."
-            })
-    
-    elif parsed.intent == Intent.ANALYZE_COMBINED:
-        # 组合分析
-        if len(st.session_state.policy_cache) >= 2:
-            st.session_state.analysis_direction = parsed.analysis_direction
-            st.session_state.trigger_compare = True
-            st.rerun()
-        else:
-            st.session_state.messages.append({
-                "role": "assistant",
-                "content": "❌ 组合分析需要至少2个政策，请先暂存更多政策。"
-            })
-    
-    elif parsed.intent == Intent.ANALYZE_SINGLE:
-        # 单篇分析 (通过自然语言触发)
-        if parsed.select_indices and st.session_state.search_results:
-            idx = parsed.select_indices[0]
-            if 1 <= idx <= len(st.session_state.search_results):
-                st.session_state.selected_for_analysis = st.session_state.search_results[idx - 1]
-                st.session_state.trigger_single_analysis = True
-                st.rerun()
-    
-    elif parsed.intent == Intent.CLEAR_CACHE:
-        st.session_state.policy_cache = []
-        st.session_state.messages.append({
-            "role": "assistant",
-            "content": "✅ 暂存池已清空。"
-        })
-    
-    else:
-        # 普通对话
-        st.session_state.messages.append({
-            "role": "assistant",
-            "content": parsed.message or "我可以帮您检索政策、暂存感兴趣的文件、进行单独或组合分析。请告诉我您的需求。"
-        })
+        parsed = get_router().parse(user_input, context)
+        reply = INTENT_HANDLERS.get(parsed.intent, _handle_chat)(parsed)
     
+    if reply:
+        st.session_state.messages.append({"role": "assistant", "content": reply})
     st.rerun()
 
-# --- 触发单政策分析 ---
-if st.session_state.get('trigger_single_analysis'):
-    policy = st.session_state.get('selected_for_analysis')
-    if policy:
-        # 进度展示 (在输入框上方)
-        progress_bar = progress_container.progress(0)
-        status_text = progress_container.empty()
-        
-        def update_progress(msg, p):
-            status_text.text(msg)
-            progress_bar.progress(p)
+# --- 后台分析任务 (单政策 / 组合分析共用，页面其余部分保持可交互) ---
+def _submit_analysis_job(fn, done_message: str, *args):
+    """
+    提交后台分析任务；fn 需接受 stage_callback 关键字参数。
+    后台线程不能直接操作 Streamlit 组件，阶段进度经队列回传主线程
+    """
+    progress_queue = queue.Queue()
+    st.session_state.analysis_progress = progress_queue
+    st.session_state.analysis_stage = ("⏳ 分析任务已提交...", 0)
+    st.session_state.analysis_log = []
+    st.session_state.analysis_done_message = done_message
+    st.session_state.analysis_future = st.session_state.executor.submit(
+        _analyze_with_report, fn, *args, stage_callback=lambda msg, p: progress_queue.put((msg, p))
+    )
 
+def _analyze_with_report(fn, *args, stage_callback):
+    """分析完成后顺带在后台线程生成 docx (写入进程级 LRU)，结果区渲染时直接命中缓存，不阻塞页面"""
+    result = fn(*args, stage_callback=stage_callback)
+    if "error" not in result:
+        from core.document_gen import ReportGenerator
+        stage_callback("📄 正在生成 Word 报告...", 95)
         try:
-            analyzer = PolicyAnalyzer()
-            analysis_json = analyzer.analyze(policy, stage_callback=update_progress)
-            
-            if "error" not in analysis_json:
-                st.session_state.analysis_result = analysis_json
-                st.session_state.messages.append({
-                    "role": "assistant",
-                    "content": f"✅ 《{policy['title']}》分析完成，报告已生成，请在下方查看或下载。"
-                })
-            else:
-                st.error(f"分析失败: {analysis_json['error']}")
-        
+            ReportGenerator.generate_docx_bytes(result)
         except Exception as e:
-            st.error(f"发生错误: {e}")
-        
-        finally:
-            time.sleep(1)
-            progress_bar.empty()
-            status_text.empty()
-            st.session_state.trigger_single_analysis = False
-            st.session_state.selected_for_analysis = None
-            st.rerun()
+            # 预生成失败不影响分析结果，下载区会再次尝试生成
+            print(f"⚠️ Word 报告预生成失败: {e}")
+    return result
 
-# --- 触发组合分析 ---
-if st.session_state.get('trigger_compare'):
-    if len(st.session_state.policy_cache) >= 2:
-        # 进度展示 (在输入框上方)
-        progress_bar = progress_container.progress(0)
-        status_text = progress_container.empty()
-        
-        def update_compare_progress(msg, p):
-            status_text.text(msg)
-            progress_bar.progress(p)
+def _run_compare(agent, policies, user_direction, stage_callback):
+    """组合分析在常驻事件循环中执行 (复用异步 LLM 客户端的连接池)"""
+    return http_client.run_sync(agent.analyze_async(
+        policies,
+        stage_callback=stage_callback,
+        user_direction=user_direction
+    ))
 
-        try:
-            result = st.session_state.compare_agent.analyze(
-                st.session_state.policy_cache, 
-                stage_callback=update_compare_progress,
-                user_direction=st.session_state.get('analysis_direction')
+if st.session_state.analysis_future is None:
+    if st.session_state.get('trigger_single_analysis'):
+        policy = st.session_state.get('selected_for_analysis')
+        if policy:
+            _submit_analysis_job(
+                get_analyzer().analyze,
+                f"✅ 《{policy['title']}》分析完成，报告已生成，请在下方查看或下载。",
+                policy
             )
-            
-            if "error" not in result:
-                st.session_state.analysis_result = result
-                st.session_state.messages.append({
-                    "role": "assistant",
-                    "content": "✅ 组合分析完成，已为您生成 2000 字深度纵深研报。"
-                })
-            else:
-                st.error(f"分析失败: {result['error']}")
-        except Exception as e:
-            st.error(f"发生错误: {e}")
-        finally:
-            time.sleep(1)
-            progress_bar.empty()
-            status_text.empty()
-            st.session_state.trigger_compare = False
-            st.session_state.analysis_direction = None
-            st.rerun()
-    else:
-        st.warning("组合分析需要至少2个政策，请先暂存更多政策。")
+        st.session_state.trigger_single_analysis = False
+        st.session_state.selected_for_analysis = None
+    elif st.session_state.get('trigger_compare'):
+        if len(st.session_state.policy_cache) >= 2:
+            _submit_analysis_job(
+                _run_compare,
+                "✅ 组合分析完成，已为您生成 2000 字深度纵深研报。",
+                get_compare_agent(),
+                list(st.session_state.policy_cache.values()),
+                st.session_state.get('analysis_direction')
+            )
+        else:
+            st.warning("组合分析需要至少2个政策，请先暂存更多政策。")
         st.session_state.trigger_compare = False
+        st.session_state.analysis_direction = None
+
+@st.fragment(run_every=1)
+def _poll_analysis_job():
+    """轮询后台分析任务：逐条展示已完成的阶段与当前进度，完成后写回结果并整页刷新"""
+    future = st.session_state.analysis_future
+    if future is None:
+        return
+    
+    msg, p = st.session_state.analysis_stage
+    log = st.session_state.analysis_log
+    while True:
+        try:
+            new_msg, p = st.session_state.analysis_progress.get_nowait()
+        except queue.Empty:
+            break
+        if new_msg != msg:
+            log.append(msg)
+            msg = new_msg
+    st.session_state.analysis_stage = (msg, p)
+    
+    if not future.done():
+        for done_msg in log[1:]:  # 首条为“任务已提交”占位，不展示
+            st.caption(f"✔️ {done_msg}")
+        st.progress(p, text=msg)
+        return
+    
+    st.session_state.analysis_future = None
+    try:
+        analysis_json = future.result()
+        if "error" not in analysis_json:
+            st.session_state.analysis_result = analysis_json
+            content = st.session_state.analysis_done_message
+        else:
+            content = f"❌ 分析失败: {analysis_json['error']}"
+    except Exception as e:
+        content = f"❌ 发生错误: {e}"
+    # 结果 (含失败原因) 写入对话区，而不是一闪而过的 st.error
+    st.session_state.messages.append({"role": "assistant", "content": content})
+    st.rerun()
+
+if st.session_state.analysis_future is not None:
+    with progress_container:
+        _poll_analysis_job()
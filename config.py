@@ -12,10 +12,32 @@ class Config:
     # 搜索配置
     SERPER_API_KEY = os.getenv("SERPER_API_KEY")
     
+    # 网络配置：证书不规范、需跳过 TLS 校验的站点域名 (逗号分隔，需完整列出，不含子域名)
+    TLS_INSECURE_HOSTS = [h.strip() for h in os.getenv("TLS_INSECURE_HOSTS", "").split(",") if h.strip()]
+    
     # 业务规则配置 (对应 PRD 2.2)
     MAX_SEARCH_RESULTS = 10
     MAX_INPUT_TOKENS = 20000
     MAX_OUTPUT_TOKENS = 5000
+    CONTENT_TOKEN_BUDGET = 12000  # 送入 LLM 的政策全文参考部分的 token 上限 (Qwen 分词器计数；未安装 dashscope 时按字符数)
+    RAG_MIN_CHARS = 3000  # 正文短于该字数时不建 RAG 索引，全文仅通过政策全文参考部分发送一次
+
+    # 缓存配置
+    DOCX_CACHE_SIZE = 32  # 进程内缓存的 Word 报告份数
+    PAGE_CACHE_SIZE = 128  # 进程内缓存的网页正文篇数 (单政策分析与组合分析共用)
+    PAGE_CACHE_TTL = 3600  # 网页正文缓存有效期 (秒)
+    ANALYSIS_CACHE_SIZE = 64  # 进程内缓存的单政策分析结果份数
+    ANALYSIS_CACHE_TTL = 24 * 3600  # 单政策分析结果缓存有效期 (秒)
+    CACHE_DIR = os.getenv("CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache"))  # 持久化缓存目录
+    LLM_CACHE_TTL = 7 * 24 * 3600  # LLM 响应持久化缓存有效期 (秒)
+    COMPARE_CACHE_TTL = 24 * 3600  # 组合分析结果持久化缓存有效期 (秒)
+    HTTP_CACHE_TTL = 30 * 24 * 3600  # 网页/PDF 原始内容的本地保留期 (秒)；每次仍用 ETag 等向源站确认未变更
+    HTTP_CACHE_MAX_BYTES = 256 * 1024 * 1024  # 网页/PDF 原始内容缓存的总容量 (压缩后字节)，超出时淘汰最久未用的条目
+    QUERY_VECTOR_CACHE_SIZE = 256  # 进程内缓存的 RAG 检索 query 向量条数 (检索维度固定，各次分析复用)
+    # 语义缓存默认停用：同一政策的不同版本 (如征求意见稿与正式稿) 向量也可能极其相似
+    SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "").lower() in ("1", "true", "yes")
+    SEMANTIC_CACHE_THRESHOLD = 0.95  # 语义缓存命中所需的最低余弦相似度
+    SEMANTIC_CACHE_SIZE = 512  # 语义缓存最多保留的条目数 (超出后淘汰最旧的条目)
 
     @staticmethod
     def validate():
@@ -1,20 +1,77 @@
+import asyncio
+import hashlib
 import os
-import json
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Dict, Any, List
+from functools import partial
+from typing import Dict, Any, List, Optional, Tuple, Union
 
-from langchain_community.document_loaders import WebBaseLoader
 from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
+from langchain_core.messages import BaseMessage, HumanMessage
 
-# 引入核心模块
+try:
+    # DashScope SDK 自带 Qwen 分词器词表 (随包分发的本地文件，加载时无需联网)
+    from dashscope import get_tokenizer
+    HAS_QWEN_TOKENIZER = True
+except ImportError:
+    HAS_QWEN_TOKENIZER = False
+
+# 引入核心模块 (作为脚本直接运行时才需要把项目根目录加入 sys.path)
 import sys
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from config import Config
+try:
+    from config import Config
+except ImportError:
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from config import Config
 from .rag_engine import rag_engine
 from .pdf_extractor import pdf_extractor
+from .web_loader import fetch_page
+from . import http_client
+from . import json_utils
+from .cache import LRUCache, DiskCache
+from .semantic_cache import SemanticCache
+from .stream_progress import StreamProgress
+
+def _load_tokenizer():
+    """加载 Qwen 分词器；未安装 dashscope 或加载失败时返回 None (按字符数截断)"""
+    if not HAS_QWEN_TOKENIZER:
+        return None
+    try:
+        return get_tokenizer("qwen-turbo")  # Qwen 系列模型共用同一词表
+    except Exception as e:
+        print(f"⚠️ Qwen 分词器加载失败，按字符数截断正文: {e}")
+        return None
+
+
+def _truncate_to_tokens(text: str, max_tokens: int, tokenizer=None) -> str:
+    """
+    按 Qwen 分词器的 token 数截断正文：只编码一次，未超出预算时原样返回 (不复制)。
+    分词器不可用时按字符数截断：Qwen 词表中常用汉字多为 1 个 token，同一上限只会略少于预算
+    """
+    if tokenizer is None:
+        return text[:max_tokens]  # 未超出时切片返回原对象，不复制
+    tokens = tokenizer.encode(text)
+    if len(tokens) <= max_tokens:
+        return text
+    return tokenizer.decode(tokens[:max_tokens]).rstrip("\ufffd")  # 去掉被截断的半个多字节字符
+
+
+# 单政策分析结果缓存：{(link, 模型, 提示词版本): result}；分析在后台线程池中执行，读写加锁
+_analysis_cache = LRUCache(maxsize=Config.ANALYSIS_CACHE_SIZE, ttl=Config.ANALYSIS_CACHE_TTL)
+_analysis_cache_lock = threading.Lock()
+
+# LLM 响应持久化缓存：{sha256(模型 + 温度 + 提示词 + 输入): 原始 JSON 字符串}，进程重启后仍可命中
+_llm_cache = DiskCache(os.path.join(Config.CACHE_DIR, "llm_responses.sqlite"), ttl=Config.LLM_CACHE_TTL)
+# 语义缓存：标题 + 原文条款的向量足够相似 (如同一政策的不同转载页) 时复用 LLM 响应；默认停用，停用时不计算向量
+_semantic_cache = SemanticCache(
+    os.path.join(Config.CACHE_DIR, "llm_semantic"),
+    threshold=Config.SEMANTIC_CACHE_THRESHOLD,
+    ttl=Config.LLM_CACHE_TTL,
+    maxsize=Config.SEMANTIC_CACHE_SIZE
+) if Config.SEMANTIC_CACHE_ENABLED else None
 
 class PolicyAnalyzer:
     """
@@ -27,7 +84,23 @@ class PolicyAnalyzer:
     6. 输出结构化 JSON (含 PDF 下载链接)
     """
 
+    # 提示词版本：修改 system_prompt / user_prompt 后递增，使旧的缓存分析结果失效
+    PROMPT_VERSION = "v2"
+
+    # LLM 阶段的进度文案保持不变 (进度区按文案变化记录已完成阶段)，只推进百分比
+    LLM_STAGE_MESSAGE = "📊 正在调用 Qwen-Max 进行投研深度分析..."
+    # 报告 JSON 的预估长度 (字符)，用于流式输出时估算进度
+    EXPECTED_OUTPUT_CHARS = 3000
+
+    # 短篇政策跳过 RAG 时原文依据部分的说明：全文已在【政策全文参考】中，不再重复发送
+    SHORT_TEXT_CITATION_NOTE = "(正文较短，全文见下方【政策全文参考】，请直接引用其中原文)"
+
+    # 批量分析的并发上限，避免触发 DashScope 限流
+    MAX_CONCURRENT_ANALYSES = 5
+
     def __init__(self):
+        # 分词器在构造时加载一次 (本地词表)，请求路径中不再有加载或下载
+        self._tokenizer = _load_tokenizer()
         self.llm = ChatOpenAI(
             api_key=Config.DASHSCOPE_API_KEY,
             base_url="https://dashscope.aliyuncs.com/compatible-mode/v1",
@@ -38,83 +111,7 @@ class PolicyAnalyzer:
             }
         )
 
-    def scrape_url(self, url: str) -> str:
-        """网页抓取"""
-        print(f"🕷️ 正在读取网页内容: {url} ...")
-        try:
-            loader = WebBaseLoader(url)
-            loader.requests_kwargs = {'verify': False, 'timeout': 15}
-            docs = loader.load()
-            content = "\n\n".join([d.page_content for d in docs])
-            return content[:25000] # 扩大抓取范围，交给 RAG 处理
-        except Exception as e:
-            print(f"❌ 网页抓取失败: {e}")
-            return ""
-
-    def analyze(self, policy_data: Dict[str, Any], stage_callback=None) -> Dict[str, Any]:
-        """
-        核心分析逻辑 (支持 RAG、PDF解析 和 阶段回调)
-        """
-        url = policy_data.get('link')
-        pdf_download_url = None
-        content_source = "webpage"  # Debug: 记录内容来源
-        
-        # Step 1: 先尝试提取 PDF（政策原文通常在 PDF 中）
-        if stage_callback: stage_callback("📄 正在检测 PDF 政策原文...", 10)
-        pdf_result = pdf_extractor.extract_and_parse(url)
-        
-        raw_text = ""
-        
-        # 优先使用 PDF 内容（只要有实质内容）
-        if pdf_result["pdf_content"] and len(pdf_result["pdf_content"]) > 500:
-            print(f"✅ 检测到 PDF 政策原文，优先使用 PDF 内容 ({len(pdf_result['pdf_content'])} 字)")
-            raw_text = pdf_result["pdf_content"]
-            pdf_download_url = pdf_result["source_pdf_url"]
-            content_source = "pdf"
-        else:
-            # Fallback: 抓取网页内容
-            if stage_callback: stage_callback("📖 未找到 PDF，正在读取网页内容...", 20)
-            raw_text = self.scrape_url(url)
-            content_source = "webpage"
-            # 记录 PDF 提取失败的诊断信息
-            pdf_extraction_error = pdf_result.get("error", "未知原因")
-            pdf_links_found = pdf_result.get("pdf_links", [])
-            if pdf_links_found:
-                pdf_download_url = pdf_links_found[0]["url"]
-                print(f"⚠️ 发现 {len(pdf_links_found)} 个 PDF 链接但解析失败: {pdf_extraction_error}")
-                print(f"   首个链接: {pdf_download_url[:80]}...")
-            else:
-                print(f"⚠️ 未在页面中发现任何 PDF 链接")
-        
-        if not raw_text:
-            return {"error": "无法获取网页或PDF内容"}
-
-        # Step 2: RAG 索引
-        if stage_callback: stage_callback("🧠 正在构建语义索引 (RAG)...", 30)
-        vector_store = rag_engine.create_index(raw_text)
-        
-        # Step 3: 原文检索
-        if stage_callback: stage_callback("🔍 正在检索原文关键条款...", 50)
-        
-        # 优化检索 query：覆盖更多政策重点场景
-        search_queries = [
-            "新增条款和规定",           # 新监管类
-            "修订内容和调整幅度",       # 修订类
-            "数量限制、比例要求、金额上限",  # 数字细节
-            "生效日期、过渡期、实施时间",   # 时间节点
-            "违规处罚、法律责任、监管措施",  # 合规重点
-            "公募基金、指数基金、ETF相关规定",  # 行业相关
-            "信息披露、报告义务、备案要求"   # 合规义务
-        ]
-        original_citations = rag_engine.get_context_for_analysis(vector_store, search_queries, k=4)
-        
-        # 打印检索结果用于调试
-        print(f"🔍 RAG 检索结果: {len(original_citations)} 字符")
-
-        # Step 4: LLM 分析
-        if stage_callback: stage_callback("📊 正在调用 Qwen-Max 进行投研深度分析...", 70)
-        
-        system_prompt = """你是【易方达基金首席政策分析师】，请严格基于政策原文撰写专业投研报告。
+        self.system_prompt = """你是【易方达基金首席政策分析师】，请严格基于政策原文撰写专业投研报告。
 
 【金融行业简称对照表】(分析时需理解这些对等概念)
 - 公募基金 = 公开募集证券投资基金
@@ -163,7 +160,7 @@ class PolicyAnalyzer:
 
 【输出JSON格式】
 {{
-  "selected_policy": {{"title": "{title}", "issuer": "{source}", "publish_date": "{date}", "url": "{url}"}},
+  "selected_policy": {{"title": "政策标题", "issuer": "发布机构", "publish_date": "发布日期", "url": "原文链接"}},
   "chat_bullets": ["核心观点1(含原文引用)", "核心观点2", "核心观点3", "核心观点4", "核心观点5", "核心观点6"],
   "docx_content": {{
     "摘要": ["段落1", "段落2"],
@@ -176,7 +173,13 @@ class PolicyAnalyzer:
 }}
 """
         
-        user_prompt = """请基于以下政策内容撰写约1800字的专业分析报告。
+        self.user_prompt = """请基于以下政策内容撰写约1800字的专业分析报告。
+
+【政策信息】
+- 标题：{title}
+- 发布机构：{source}
+- 发布日期：{date}
+- 原文链接：{url}
 
 【RAG检索到的关键原文】(请优先引用这些条款)
 {citations}
@@ -198,25 +201,225 @@ class PolicyAnalyzer:
 - 严格输出JSON格式，勿添加markdown标记
 """
 
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", system_prompt),
-            ("user", user_prompt)
-        ])
+        # system 提示词不含任何变量 (政策元信息放在 user 消息中)，各次调用的消息前缀完全一致，
+        # 可命中 DashScope 的隐式上下文缓存，减少重复计费的输入 token 与首字延迟。
+        # 因此 system 消息只渲染一次 (还原模板中转义的花括号)；每次调用仅用 str.format 填充 user 消息，
+        # 直接交给模型流式输出，省去 prompt | llm | parser 调用链的逐次调度开销
+        self._system_message = ChatPromptTemplate.from_messages([("system", self.system_prompt)]).format_messages()[0]
+
+    def _build_messages(self, chain_inputs: Dict[str, Any]) -> List[BaseMessage]:
+        return [self._system_message, HumanMessage(content=self.user_prompt.format(**chain_inputs))]
+
+    def _llm_cache_key(self, chain_inputs: Dict[str, Any]) -> str:
+        """模型、温度、提示词模板与输入完全一致时才视为同一次调用"""
+        payload = {
+            "model": Config.MODEL_NAME,
+            "temperature": self.llm.temperature,
+            "system": self.system_prompt,
+            "user": self.user_prompt,
+            "inputs": chain_inputs,
+        }
+        return hashlib.sha256(json_utils.dumps(payload, sort_keys=True)).hexdigest()
+
+    def _semantic_vector(self, policy_data: Dict[str, Any], citations: str) -> Optional[List[float]]:
+        """语义缓存的检索向量 (标题 + 原文条款)；Embedding 失败时返回 None，直接调用 LLM"""
+        try:
+            return rag_engine.embeddings.embed_query(f"{policy_data.get('title', '')}\n{citations[:2000]}")
+        except Exception as e:
+            print(f"⚠️ 语义缓存向量计算失败 (跳过): {e}")
+            return None
 
-        chain = prompt | self.llm | StrOutputParser()
+    def _stream_response(self, chain_inputs: Dict[str, Any], stage_callback=None) -> str:
+        """
+        流式接收输出：生成期间按已收到的字数推进进度条 (70% → 89%)，而不是整段等待；
+        输出中出现报告各部分的字段名时切换阶段文案 (按输出顺序依次检测)
+        """
+        chunks = []
+        progress = StreamProgress(stage_callback, self.LLM_STAGE_MESSAGE, 70, 89, self.EXPECTED_OUTPUT_CHARS)
+        for message_chunk in self.llm.stream(self._build_messages(chain_inputs)):
+            chunks.append(message_chunk.content)
+            progress.feed(message_chunk.content)
+        return "".join(chunks)
+
+    def scrape_url(self, url: str) -> str:
+        """网页抓取，只返回正文 (scrape_page 的简化封装)"""
+        _, content = self.scrape_page(url)
+        return content[:25000] # 扩大抓取范围，交给 RAG 处理
+
+    def scrape_page(self, url: str) -> Tuple[Optional[Union[str, bytes]], str]:
+        """抓取网页，返回 (原始 HTML, 正文)；失败时返回 (None, "")，PDF 提取器会自行重试请求页面"""
+        print(f"🕷️ 正在读取网页内容: {url} ...")
+        try:
+            return fetch_page(url, timeout=15)
+        except Exception as e:
+            print(f"❌ 网页抓取失败: {e}")
+            return None, ""
+
+    def analyze(self, policy_data: Dict[str, Any], stage_callback=None) -> Dict[str, Any]:
+        """
+        分析单个政策；同一链接 + 模型 + 提示词版本的成功结果在进程内缓存 (跨会话共享)，重复分析直接返回
+        """
+        cache_key = (policy_data.get('link'), Config.MODEL_NAME, self.PROMPT_VERSION)
+        with _analysis_cache_lock:
+            cached = _analysis_cache.get(cache_key)
+        if cached is not None:
+            print(f"♻️ 复用已缓存的分析结果: {policy_data.get('title')}")
+            return dict(cached)
+        
+        result = self._analyze(policy_data, stage_callback)
+        if "error" not in result:
+            with _analysis_cache_lock:
+                _analysis_cache.put(cache_key, result)
+        return dict(result)
+
+    def analyze_batch(self, policies: List[Dict[str, Any]], stage_callback=None,
+                      max_concurrency: Optional[int] = None) -> List[Dict[str, Any]]:
+        """批量分析多个政策 (同步入口)，结果与输入一一对应"""
+        return http_client.run_sync(self.aanalyze_batch(policies, stage_callback, max_concurrency))
+
+    async def aanalyze_batch(self, policies: List[Dict[str, Any]], stage_callback=None,
+                             max_concurrency: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        并发分析多个政策：各政策的抓取、索引与 LLM 调用互不依赖，信号量限制同时进行的分析数。
+        单篇失败以 {"error": ...} 返回，不影响其余政策；阶段进度文案带上政策序号。
+        """
+        limit = max_concurrency or self.MAX_CONCURRENT_ANALYSES
+        semaphore = asyncio.Semaphore(limit)
+        total = len(policies)
+        loop = asyncio.get_running_loop()
+        
+        # analyze 为阻塞实现 (PDF 下载、向量索引)，且内部经 run_sync 把网页抓取提交回本循环，
+        # 抓取又依赖循环的默认线程池解析正文。因此分析必须在独立线程池中执行：
+        # 若占用默认线程池，线程数不超过并发上限时 (如单核机器默认仅 5 个线程) 会互相等待而死锁
+        pool = ThreadPoolExecutor(max_workers=limit, thread_name_prefix="policy-analyze")
+        
+        async def _one(i: int, policy: Dict[str, Any]) -> Dict[str, Any]:
+            callback = None
+            if stage_callback:
+                callback = lambda msg, p: stage_callback(f"[{i}/{total}] {msg}", p)
+            async with semaphore:
+                return await loop.run_in_executor(pool, partial(self.analyze, policy, callback))
+        
+        try:
+            results = await asyncio.gather(*[
+                _one(i, p) for i, p in enumerate(policies, 1)
+            ], return_exceptions=True)
+        finally:
+            pool.shutdown(wait=False)  # 不阻塞事件循环；正常结束时线程均已空闲
+        return [r if isinstance(r, dict) else {"error": str(r)} for r in results]
+
+    def _analyze(self, policy_data: Dict[str, Any], stage_callback=None) -> Dict[str, Any]:
+        """
+        核心分析逻辑 (支持 RAG、PDF解析 和 阶段回调)
+        """
+        url = policy_data.get('link')
+        pdf_download_url = None
+        content_source = "webpage"  # Debug: 记录内容来源
+        
+        # Step 1: 先尝试提取 PDF（政策原文通常在 PDF 中）
+        # 页面只请求一次：HTML 用于查找 PDF 附件，正文留作 PDF 不可用时的备选
+        if stage_callback: stage_callback("📄 正在检测 PDF 政策原文...", 10)
+        page_html, page_text = self.scrape_page(url)
+        pdf_result = pdf_extractor.extract_and_parse(url, page_html)
+        
+        raw_text = ""
+        
+        # 优先使用 PDF 内容（只要有实质内容）
+        if pdf_result["pdf_content"] and len(pdf_result["pdf_content"]) > 500:
+            print(f"✅ 检测到 PDF 政策原文，优先使用 PDF 内容 ({len(pdf_result['pdf_content'])} 字)")
+            raw_text = pdf_result["pdf_content"]
+            pdf_download_url = pdf_result["source_pdf_url"]
+            content_source = "pdf"
+        else:
+            # Fallback: 抓取网页内容
+            if stage_callback: stage_callback("📖 未找到 PDF，正在读取网页内容...", 20)
+            raw_text = page_text[:25000] # 扩大抓取范围，交给 RAG 处理
+            content_source = "webpage"
+            # 记录 PDF 提取失败的诊断信息
+            pdf_extraction_error = pdf_result.get("error", "未知原因")
+            pdf_links_found = pdf_result.get("pdf_links", [])
+            if pdf_links_found:
+                pdf_download_url = pdf_links_found[0]["url"]
+                print(f"⚠️ 发现 {len(pdf_links_found)} 个 PDF 链接但解析失败: {pdf_extraction_error}")
+                print(f"   首个链接: {pdf_download_url[:80]}...")
+            else:
+                print(f"⚠️ 未在页面中发现任何 PDF 链接")
+        
+        if not raw_text:
+            return {"error": "无法获取网页或PDF内容"}
+
+        short_text = len(raw_text) < Config.RAG_MIN_CHARS
+        if short_text:
+            # 短篇政策：检索只会把全文原样返回，跳过 Embedding 与索引构建；
+            # 全文已完整放在【政策全文参考】中，原文依据部分只放一行说明，避免同一全文发送两次
+            print(f"📄 正文较短 ({len(raw_text)} 字)，跳过 RAG 索引，直接使用全文")
+            original_citations = self.SHORT_TEXT_CITATION_NOTE
+        else:
+            # Step 2: RAG 索引
+            if stage_callback: stage_callback("🧠 正在构建语义索引 (RAG)...", 30)
+            vector_store = rag_engine.create_index(raw_text)
+            
+            # Step 3: 原文检索
+            if stage_callback: stage_callback("🔍 正在检索原文关键条款...", 50)
+            
+            # 优化检索 query：覆盖更多政策重点场景
+            search_queries = [
+                "新增条款和规定",           # 新监管类
+                "修订内容和调整幅度",       # 修订类
+                "数量限制、比例要求、金额上限",  # 数字细节
+                "生效日期、过渡期、实施时间",   # 时间节点
+                "违规处罚、法律责任、监管措施",  # 合规重点
+                "公募基金、指数基金、ETF相关规定",  # 行业相关
+                "信息披露、报告义务、备案要求"   # 合规义务
+            ]
+            original_citations = rag_engine.get_context_for_analysis(vector_store, search_queries, k=4)
+        
+        # 打印检索结果用于调试
+        print(f"🔍 RAG 检索结果: {len(original_citations)} 字符")
+
+        # Step 4: LLM 分析
+        if stage_callback: stage_callback(self.LLM_STAGE_MESSAGE, 70)
         
         try:
-            response_str = chain.invoke({
+            chain_inputs = {
                 "title": policy_data.get('title'),
                 "source": policy_data.get('source'),
                 "date": policy_data.get('date'),
                 "url": url,
                 "citations": original_citations,
-                "content": raw_text[:12000] # 发送部分全文作为背景
-            })
+                "content": _truncate_to_tokens(raw_text, Config.CONTENT_TOKEN_BUDGET, self._tokenizer)  # 发送部分全文作为背景
+            }
+            llm_cache_key = self._llm_cache_key(chain_inputs)
+            response_str = _llm_cache.get(llm_cache_key)
+            semantic_vector = None
+            if response_str is not None:
+                print("♻️ 命中 LLM 响应缓存，跳过模型调用")
+            else:
+                if _semantic_cache is not None:
+                    # 短篇政策没有检索结果，以全文计算向量
+                    semantic_text = raw_text if short_text else original_citations
+                    semantic_vector = self._semantic_vector(policy_data, semantic_text)
+                if semantic_vector is not None:
+                    response_str = _semantic_cache.lookup(semantic_vector)
+                if response_str is None:
+                    response_str = self._stream_response(chain_inputs, stage_callback)
+                else:
+                    semantic_vector = None  # 命中语义缓存，无需重复写入
             
             if stage_callback: stage_callback("📝 正在整理输出最终报告...", 90)
-            result = json.loads(response_str)
+            result = json_utils.loads_llm(response_str)
+            # 只缓存可解析的响应
+            _llm_cache.set(llm_cache_key, response_str)
+            if semantic_vector is not None:
+                _semantic_cache.add(semantic_vector, response_str)
+            
+            # 政策元信息以当前政策为准 (语义缓存命中时响应可能来自另一转载页)
+            result["selected_policy"] = {
+                "title": policy_data.get('title'),
+                "issuer": policy_data.get('source'),
+                "publish_date": policy_data.get('date'),
+                "url": url
+            }
             
             # 注入 PDF 下载链接
             if pdf_download_url:
@@ -233,4 +436,7 @@ class PolicyAnalyzer:
             
         except Exception as e:
             print(f"❌ LLM 分析失败: {e}")
-            return {"error": str(e)}
\ No newline at end of file
+            return {"error": str(e)}
+
+# 单例模式供外部调用：各次分析共享同一个 ChatOpenAI 客户端与连接池
+policy_analyzer = PolicyAnalyzer()
@@ -0,0 +1,143 @@
+"""
+Cache: 缓存工具
+
+- LRUCache: 进程/会话内使用的容量受限 LRU 缓存。
+  基于 OrderedDict (哈希表 + 双向链表)，读写均为 O(1)：
+  命中时移到队尾，写入超出容量时淘汰队首 (最久未使用) 的条目；
+  可选 ttl (秒)，读取时丢弃过期条目。
+- DiskCache: 基于 SQLite 的持久化键值缓存 (字符串/字节值 + 过期时间)，进程重启后仍然有效。
+  安装了 zstandard 时值以 Zstandard (level 3) 压缩存储，中文政策文本/JSON 通常可压缩数倍。
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Tuple, Union
+
+try:
+    import zstandard
+    HAS_ZSTD = True
+except ImportError:
+    HAS_ZSTD = False
+
+_MISSING = object()
+
+# DiskCache 值的压缩级别：3 为 zstd 默认级别，压缩率与速度兼顾
+ZSTD_LEVEL = 3
+
+
+class LRUCache:
+    """容量受限的 LRU 缓存，可直接存放在 st.session_state 中跨 rerun 保留"""
+
+    def __init__(self, maxsize: int = 64, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: Hashable, default: Optional[Any] = None) -> Any:
+        """命中时刷新为最近使用；未命中或已过期返回 default (过期条目顺带删除)"""
+        entry = self._data.get(key)
+        if entry is None:
+            return default
+        ts, value = entry
+        if self.ttl is not None and time.monotonic() - ts >= self.ttl:
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """写入并标记为最近使用，超出容量时淘汰最久未使用的条目"""
+        self._data[key] = (time.monotonic(), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def evict(self, key: Hashable) -> None:
+        """移除指定条目 (不存在时忽略)"""
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class DiskCache:
+    """
+    SQLite 持久化缓存：值为字符串或字节 (原样取回)，写入时指定有效期；多线程共享同一连接，读写加锁
+
+    指定 max_bytes 时限制存储总量 (按压缩后大小)：命中会顺延有效期，超出时按到期时间先后淘汰，即近似 LRU
+    """
+
+    def __init__(self, path: str, ttl: float, max_bytes: Optional[int] = None):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            # codec 记录值的压缩方式 (zstd / raw)，读取时按此解压；is_text 记录原值是否为字符串
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value BLOB NOT NULL, "
+                "codec TEXT NOT NULL, is_text INTEGER NOT NULL, expires REAL NOT NULL)"
+            )
+            # 启动时顺带清理过期条目
+            self._conn.execute("DELETE FROM entries WHERE expires < ?", (time.time(),))
+
+    def get(self, key: str) -> Optional[Union[str, bytes]]:
+        """未命中或已过期返回 None (以当前环境无法解压的条目也视为未命中)"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, codec, is_text FROM entries WHERE key = ? AND expires >= ?", (key, now)
+            ).fetchone()
+            if row is not None and self.max_bytes is not None:
+                with self._conn:
+                    self._conn.execute("UPDATE entries SET expires = ? WHERE key = ?", (now + self.ttl, key))
+        if row is None:
+            return None
+        value, codec, is_text = row
+        if codec == "zstd":
+            if not HAS_ZSTD:
+                return None
+            value = zstandard.decompress(value)
+        return value.decode("utf-8") if is_text else value
+
+    def set(self, key: str, value: Union[str, bytes]) -> None:
+        is_text = isinstance(value, str)
+        data = value.encode("utf-8") if is_text else value
+        codec = "raw"
+        if HAS_ZSTD:
+            data, codec = zstandard.compress(data, ZSTD_LEVEL), "zstd"
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, codec, is_text, expires) VALUES (?, ?, ?, ?, ?)",
+                (key, data, codec, int(is_text), time.time() + self.ttl)
+            )
+            if self.max_bytes is not None:
+                self._evict_over_limit()
+
+    def _evict_over_limit(self) -> None:
+        """总量超出 max_bytes 时从最早到期的条目开始删除 (调用方持锁并处于事务中)"""
+        total = self._conn.execute("SELECT COALESCE(SUM(LENGTH(value)), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        stale = []
+        for key, size in self._conn.execute("SELECT key, LENGTH(value) FROM entries ORDER BY expires").fetchall():
+            if total <= self.max_bytes:
+                break
+            stale.append((key,))
+            total -= size
+        self._conn.executemany("DELETE FROM entries WHERE key = ?", stale)
+
+    def delete(self, key: str) -> None:
+        """移除指定条目 (不存在时忽略)"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
@@ -9,6 +9,8 @@ Compare Agent: 多政策组合分析
 5. 投资策略建议
 """
 
+import asyncio
+import hashlib
 import json
 import os
 import sys
@@ -16,11 +18,19 @@ from typing import List, Dict, Any
 
 from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
-from langchain_community.document_loaders import WebBaseLoader
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, HumanMessage, SystemMessage
+from langchain_core.messages.ai import add_ai_message_chunks
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from config import Config
+from core import http_client
+from core.web_loader import afetch_text
+from core import json_utils
+from core.cache import DiskCache
+from core.stream_progress import StreamProgress
+
+# 组合分析结果持久化缓存：{sha256(模型 + 温度 + 提示词版本 + 政策列表 + 侧重方向): 解析后结果的 JSON}
+_compare_cache = DiskCache(os.path.join(Config.CACHE_DIR, "compare_results.sqlite"), ttl=Config.COMPARE_CACHE_TTL)
 
 
 class CompareAgent:
@@ -34,6 +44,7 @@ class CompareAgent:
             base_url="https://dashscope.aliyuncs.com/compatible-mode/v1",
             model=Config.MODEL_NAME,
             temperature=0.15,  # 降低温度以减少幻觉风险
+            stream_usage=True,  # 流式输出时同样返回 token 用量 (含前缀缓存命中数)
             model_kwargs={
                 "response_format": {"type": "json_object"}
             }
@@ -72,10 +83,94 @@ class CompareAgent:
 
 【禁令】严禁使用点状列表。文字要求具备深度，逻辑连贯，语气符合专业研报规范。
 """
+        # system 消息固定不变，只渲染一次 (还原模板中转义的花括号)；
+        # 每次调用的消息前缀完全一致，可命中 DashScope 的隐式上下文缓存
+        self._system_message = ChatPromptTemplate.from_messages([("system", self.system_prompt)]).format_messages()[0]
+        
+        # map 阶段 (政策较多时按组提炼要点) 的 system 消息，同样固定不变
+        self._map_system_message = SystemMessage(content=f"""你是【易方达基金政策研究助理】。
+请从每份政策的原文节选中提炼对投研最重要的内容：核心条款、监管要求、数量/比例/日期等关键数字、生效与过渡安排。
+
+【要求】
+1. 尽量保留原文表述，数字、日期、比例、条款编号必须与原文一致，严禁推测或编造。
+2. 原文节选缺失时，仅依据摘要提炼，并注明"原文未获取"。
+3. 每份政策的要点约 {self.MAP_DIGEST_CHARS // 2} 字，不超过 {self.MAP_DIGEST_CHARS} 字，成段叙述。
+
+【输出 JSON 格式】
+{{"digests": ["政策要点1", "政策要点2", ...]}}  (顺序、数量与输入的政策一一对应)
+""")
+        
+        # 结果缓存命中统计 (本实例)
+        self.cache_hits = 0
+        self.cache_misses = 0
     
+    # 并发抓取原文的上限，避免同时打开过多连接
+    MAX_CONCURRENT_FETCHES = 8
+
+    # 每篇政策原文节选的字数上限
+    MAX_EXCERPT_CHARS = 3000
+    # 政策数超过该值时改为 map-reduce：先按组并发提炼各政策要点 (map)，再基于要点进行一次综合研判 (reduce)，
+    # 避免把全部原文塞进同一次请求 (输入过长，预填充耗时随之增长)，同时每篇政策保留完整的节选预算
+    MAP_REDUCE_THRESHOLD = 5
+    # map 阶段每组的政策数
+    MAP_CHUNK_SIZE = 3
+    # map 阶段每篇政策要点的字数上限 (提炼失败时以截断后的原文节选代替)
+    MAP_DIGEST_CHARS = 1000
+
+    # 生成阶段的进度文案 (进度区按文案变化记录已完成阶段)
+    LLM_STAGE_MESSAGE = "🧠 正在生成 2000 字深度研判报告..."
+    # 报告 JSON 的预估长度 (字符)，用于流式输出时估算进度
+    EXPECTED_OUTPUT_CHARS = 5000
+    # 提示词版本：修改 system_prompt / user_prompt 后递增，使旧的缓存结果失效
+    PROMPT_VERSION = "v2"
+    # 仅在低温度 (输出近似确定) 时缓存结果
+    MAX_CACHEABLE_TEMPERATURE = 0.2
+    @staticmethod
+    def _prompt_fields(p: Dict[str, Any]) -> Dict[str, Any]:
+        """政策在提示词中呈现的字段 (含缺省值)；缓存键取同一组值，提示词不同的两次分析不会共用结果"""
+        return {
+            "title": p.get('title', '未知'),
+            "source": p.get('source', '未知'),
+            "date": p.get('date', '未知'),
+            "summary": p.get('summary', p.get('snippet', '无摘要')),  # 检索结果只有 snippet
+            "link": p.get('link'),  # 原文节选按链接抓取
+        }
+
+    def _cache_key(self, policies: List[Dict[str, Any]], user_direction) -> str:
+        """同一组政策 (顺序影响报告中的政策编号，保留原顺序) + 相同侧重方向视为同一次分析"""
+        payload = {
+            "model": Config.MODEL_NAME,
+            "temperature": self.llm.temperature,
+            "prompt_version": self.PROMPT_VERSION,
+            "policies": [self._prompt_fields(p) for p in policies],
+            "direction": user_direction,
+        }
+        return hashlib.sha256(json_utils.dumps(payload, sort_keys=True)).hexdigest()
+
+    async def _fetch_excerpt_async(self, i: int, p: Dict[str, Any], semaphore: asyncio.Semaphore,
+                                   max_chars: int = MAX_EXCERPT_CHARS) -> str:
+        """异步读取单篇政策原文，取前 max_chars 字作为上下文；供 asyncio.gather 并发调度"""
+        if not p.get('link'):
+            return ""
+        async with semaphore:
+            try:
+                raw_content = await afetch_text(p['link'], timeout=10)
+                return raw_content[:max_chars]
+            except Exception as e:
+                print(f"⚠️ 获取政策{i}全文失败: {e}")
+                return ""
+
     def analyze(self, policies: List[Dict[str, Any]], stage_callback=None, user_direction=None) -> Dict[str, Any]:
         """
-        对多个政策进行组合分析
+        对多个政策进行组合分析 (同步入口)
+        """
+        # 在共享后台事件循环中执行，抓取客户端的连接池绑定该循环
+        return http_client.run_sync(self.analyze_async(policies, stage_callback, user_direction))
+
+    async def analyze_async(self, policies: List[Dict[str, Any]], stage_callback=None, user_direction=None) -> Dict[str, Any]:
+        """
+        对多个政策进行组合分析：并发抓取各政策原文，再进行一次综合研判；
+        政策数超过 MAP_REDUCE_THRESHOLD 时先按组并发提炼要点 (map)，再基于要点综合研判 (reduce)
         """
         if not policies:
             return {"error": "没有可分析的 政策"}
@@ -83,70 +178,169 @@ class CompareAgent:
         if len(policies) < 2:
             return {"error": "组合分析需要至少2个政策，请先暂存更多政策后再试"}
         
-        if stage_callback: stage_callback("📂 正在提取并交叉比对政策内容...", 20)
-        
-        # 构建政策摘要列表，并尝试获取全文
-        policy_summaries = []
-        for i, p in enumerate(policies, 1):
-            # 尝试获取政策全文（如有链接）
-            full_text_excerpt = ""
-            if p.get('link'):
+        # 同一组政策已分析过时直接复用结果，跳过原文抓取与模型调用
+        cache_key = None
+        if self.llm.temperature <= self.MAX_CACHEABLE_TEMPERATURE:
+            cache_key = self._cache_key(policies, user_direction)
+            cached = _compare_cache.get(cache_key)
+            if cached is not None:
                 try:
-                    if stage_callback: stage_callback(f"📖 正在读取政策{i}原文...", 20 + i * 10)
-                    loader = WebBaseLoader(p['link'])
-                    loader.requests_kwargs = {'verify': False, 'timeout': 10}
-                    docs = loader.load()
-                    raw_content = "\n".join([d.page_content for d in docs])
-                    # 每篇取前3000字作为上下文
-                    full_text_excerpt = raw_content[:3000]
+                    result = json_utils.loads(cached)
                 except Exception as e:
-                    print(f"⚠️ 获取政策{i}全文失败: {e}")
-            
-            summary = f"""
-【政策{i}】
-标题: {p.get('title', '未知')}
-发布机构: {p.get('source', '未知')}
-发布日期: {p.get('date', '未知')}
-内容摘要: {p.get('summary', p.get('snippet', '无摘要'))}
-
-【政策{i}原文节选】(以下为从原网页提取的内容，请基于此分析)
-{full_text_excerpt if full_text_excerpt else '(无法获取原文，请仅基于摘要谨慎分析，明确标注"原文未获取"的限制)'}
-"""
-            policy_summaries.append(summary)
+                    # 无法解析的条目直接淘汰，按未命中处理
+                    print(f"⚠️ 组合分析缓存条目损坏，已移除: {e}")
+                    _compare_cache.delete(cache_key)
+                else:
+                    self.cache_hits += 1
+                    print(f"♻️ 复用已缓存的组合分析结果 (命中 {self.cache_hits} / 未命中 {self.cache_misses})")
+                    result["_policy_count"] = len(policies)
+                    return result
+            self.cache_misses += 1
+        
+        if stage_callback: stage_callback(f"📖 正在并发读取 {len(policies)} 份政策原文...", 20)
+        
+        # 并发获取各政策全文，耗时由 N 次抓取之和降为最慢的一次；每完成一篇即刷新进度
+        semaphore = asyncio.Semaphore(self.MAX_CONCURRENT_FETCHES)
+        finished = 0
         
-        if stage_callback: stage_callback("🧠 正在生成 2000 字深度研判报告...", 50)
+        async def _fetch_and_report(i: int, p: Dict[str, Any]) -> str:
+            nonlocal finished
+            excerpt = await self._fetch_excerpt_async(i, p, semaphore)
+            finished += 1
+            if stage_callback:
+                stage_callback(f"📖 已读取 {finished}/{len(policies)} 份政策原文...", 20 + 30 * finished // len(policies))
+            return excerpt
         
-        direction_clause = f"\n特别侧重与侧点：{user_direction}\n" if user_direction else ""
+        # 单篇失败只影响该篇 (按“原文未获取”处理)，不中断整体分析
+        excerpts = await asyncio.gather(*[
+            _fetch_and_report(i, p) for i, p in enumerate(policies, 1)
+        ], return_exceptions=True)
+        excerpts = [e if isinstance(e, str) else "" for e in excerpts]
         
-        user_prompt = f"""请对以下 {len(policies)} 份政策进行综合对比分析，撰写不少于2000字的专业研报：
-{direction_clause}
+        if len(policies) > self.MAP_REDUCE_THRESHOLD:
+            digests = await self._map_digests(policies, excerpts, stage_callback)
+            policy_summaries = [
+                self._policy_block(i, p, digest, "要点提炼", "以下为从原文节选中提炼的要点，保留了原文表述")
+                for i, (p, digest) in enumerate(zip(policies, digests), 1)
+            ]
+        else:
+            policy_summaries = [
+                self._policy_block(i, p, excerpt)
+                for i, (p, excerpt) in enumerate(zip(policies, excerpts), 1)
+            ]
+        
+        if stage_callback: stage_callback(self.LLM_STAGE_MESSAGE, 50)
+        
+        direction_clause = f"特别侧重与侧点：{user_direction}\n" if user_direction else ""
+        
+        # 随请求变化的政策数量与侧重方向放在末尾，固定的开头说明可与 system 消息一起复用前缀缓存；
+        # 政策原文直接作为消息内容传入 (不经模板解析，原文中的花括号不会被当作变量)
+        user_prompt = f"""请对以下政策进行综合对比分析，撰写不少于2000字的专业研报：
 {"".join(policy_summaries)}
 
 ⚠️ 【幻觉防范 - 务必遵守】：
-- 所有数字、日期、比例必须来自上述"原文节选"，不可编造
+- 所有数字、日期、比例必须来自上述"原文节选"或"要点提炼"，不可编造
 - 如果某政策的原文节选显示"无法获取"，请明确注明分析受限
 - 引用条款时请标注来源政策编号，如"根据政策1第X条..."
 
 请注意：成段撰写，严禁点状清单，引用原文，字数务必充足。
-"""
-        
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", self.system_prompt),
-            ("user", user_prompt)
-        ])
-        
-        chain = prompt | self.llm | StrOutputParser()
+本次共 {len(policies)} 份政策。
+{direction_clause}"""
         
         try:
-            response = chain.invoke({})
+            response = await self._astream_response(
+                [self._system_message, HumanMessage(content=user_prompt)], stage_callback
+            )
+            self._log_cache_tokens(response)
             if stage_callback: stage_callback("📝 正在整理文档格式...", 90)
-            result = json.loads(response)
+            result = json_utils.loads_llm(response.content)
+            # 缓存解析 (必要时经过修复) 后的结果而非原始响应，命中时按标准 JSON 解析即可
+            if cache_key is not None:
+                _compare_cache.set(cache_key, json_utils.dumps(result))
             result["_policy_count"] = len(policies)
             return result
         except Exception as e:
             print(f"❌ 组合分析失败: {e}")
             return {"error": str(e)}
     
+    @classmethod
+    def _policy_block(cls, i: int, p: Dict[str, Any], evidence: str,
+                      evidence_title: str = "原文节选", evidence_note: str = "以下为从原网页提取的内容，请基于此分析") -> str:
+        """单篇政策在提示词中的段落：元信息 + 摘要 + 原文依据 (原文节选或 map 阶段提炼的要点)"""
+        fields = cls._prompt_fields(p)
+        return f"""
+【政策{i}】
+标题: {fields['title']}
+发布机构: {fields['source']}
+发布日期: {fields['date']}
+内容摘要: {fields['summary']}
+
+【政策{i}{evidence_title}】({evidence_note})
+{evidence if evidence else '(无法获取原文，请仅基于摘要谨慎分析，明确标注"原文未获取"的限制)'}
+"""
+
+    async def _map_digests(self, policies: List[Dict[str, Any]], excerpts: List[str], stage_callback=None) -> List[str]:
+        """
+        map 阶段：按 MAP_CHUNK_SIZE 分组，asyncio.gather 并发请求各组的政策要点，与输入一一对应。
+        某组失败或返回数量不符时，该组以截断后的原文节选代替，不影响其余各组
+        """
+        size = self.MAP_CHUNK_SIZE
+        starts = range(0, len(policies), size)
+        finished = 0
+        
+        async def _map_chunk(start: int) -> List[str]:
+            nonlocal finished
+            blocks = [
+                self._policy_block(i, p, excerpt)
+                for i, (p, excerpt) in enumerate(zip(policies[start:start + size], excerpts[start:start + size]), start + 1)
+            ]
+            prompt = f"请分别提炼以下 {len(blocks)} 份政策的要点：\n{''.join(blocks)}"
+            try:
+                response = await self.llm.ainvoke([self._map_system_message, HumanMessage(content=prompt)])
+                digests = json_utils.loads_llm(response.content).get("digests")
+                if not isinstance(digests, list) or len(digests) != len(blocks):
+                    raise ValueError(f"返回 {len(digests) if isinstance(digests, list) else 0} 条要点，应为 {len(blocks)} 条")
+                digests = [str(d)[:self.MAP_DIGEST_CHARS] for d in digests]
+            except Exception as e:
+                print(f"⚠️ 政策{start + 1}-{start + len(blocks)} 要点提炼失败，改用原文节选: {e}")
+                digests = [excerpt[:self.MAP_DIGEST_CHARS] for excerpt in excerpts[start:start + size]]
+            finished += 1
+            if stage_callback:
+                stage_callback(f"🗂️ 已提炼 {finished}/{len(starts)} 组政策要点...", 50)
+            return digests
+        
+        if stage_callback: stage_callback(f"🗂️ 政策较多，正在分 {len(starts)} 组并发提炼要点...", 50)
+        chunks = await asyncio.gather(*[_map_chunk(start) for start in starts])
+        return [digest for chunk in chunks for digest in chunk]
+
+    async def _astream_response(self, messages: List[BaseMessage], stage_callback=None) -> AIMessageChunk:
+        """
+        流式接收输出：生成期间按已收到的字数推进进度条 (50% → 89%)，而不是整段等待；
+        输出中出现报告各部分的字段名时切换阶段文案 (按输出顺序依次检测)。返回合并后的完整消息
+        """
+        chunks = []
+        progress = StreamProgress(stage_callback, self.LLM_STAGE_MESSAGE, 50, 89, self.EXPECTED_OUTPUT_CHARS)
+        async for chunk in self.llm.astream(messages):
+            chunks.append(chunk)
+            progress.feed(chunk.content)
+        if not chunks:
+            return AIMessageChunk(content="")
+        return add_ai_message_chunks(chunks[0], *chunks[1:])
+
+    @staticmethod
+    def _log_cache_tokens(response: AIMessage) -> None:
+        """打印本次调用命中前缀缓存的输入 token 数 (接口未返回用量时忽略)"""
+        usage = response.usage_metadata or {}
+        cached = (usage.get("input_token_details") or {}).get("cache_read", 0)
+        if cached:
+            print(f"♻️ 组合分析命中前缀缓存: {cached}/{usage.get('input_tokens', 0)} 输入 tokens")
+
+    # 对比表格的表头 (固定不变)
+    COMPARISON_TABLE_HEADER = (
+        "| 政策名称 | 发布机构 | 发布时间 | 核心内容 |\n"
+        "|----------|----------|----------|----------|\n"
+    )
+
     def generate_comparison_table(self, policies: List[Dict]) -> str:
         """
         生成政策对比表格（Markdown 格式）
@@ -154,18 +348,17 @@ class CompareAgent:
         if not policies:
             return "暂无政策"
         
-        header = "| 政策名称 | 发布机构 | 发布时间 | 核心内容 |\n"
-        header += "|----------|----------|----------|----------|\n"
-        
         rows = []
         for p in policies:
-            title = p.get('title', '未知')[:20] + "..." if len(p.get('title', '')) > 20 else p.get('title', '未知')
-            source = p.get('source', '未知')
-            date = p.get('date', '未知')
-            snippet = p.get('snippet', '')[:30] + "..." if len(p.get('snippet', '')) > 30 else p.get('snippet', '')
-            rows.append(f"| {title} | {source} | {date} | {snippet} |")
+            title = p.get('title', '未知')
+            if len(title) > 20:
+                title = title[:20] + "..."
+            snippet = p.get('snippet', '')
+            if len(snippet) > 30:
+                snippet = snippet[:30] + "..."
+            rows.append(f"| {title} | {p.get('source', '未知')} | {p.get('date', '未知')} | {snippet} |")
         
-        return header + "\n".join(rows)
+        return self.COMPARISON_TABLE_HEADER + "\n".join(rows)
 
 
 # 测试代码
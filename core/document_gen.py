@@ -1,9 +1,20 @@
+import io
 import os
+import sys
+from functools import lru_cache
 from docx import Document
 from docx.shared import Pt, RGBColor, Inches
 from docx.enum.text import WD_ALIGN_PARAGRAPH
 from docx.oxml.ns import qn
-from typing import Dict, Any
+from typing import Dict, Any, IO, Union
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import Config
+
+try:
+    from . import json_utils
+except ImportError:
+    import json_utils
 
 class ReportGenerator:
     """
@@ -53,10 +64,10 @@ class ReportGenerator:
         return heading
     
     @staticmethod
-    def generate_docx(analysis_data: Dict[str, Any], output_path: str = "report.docx") -> str:
+    def generate_docx(analysis_data: Dict[str, Any], output_path: Union[str, IO[bytes]] = "report.docx") -> Union[str, IO[bytes]]:
         """
         输入: LLM 分析生成的 JSON (完整结构)
-        输出: 生成文件的路径
+        输出: 生成文件的路径；若传入的是 BytesIO 等文件对象，则直接写入内存并原样返回
         """
         doc = Document()
         
@@ -137,11 +148,33 @@ class ReportGenerator:
             run.font.size = Pt(9)
             run.font.color.rgb = RGBColor(128, 128, 128)
         
-        # 保存
+        # 保存 (文件对象直接写入内存，无需落盘)
+        if not isinstance(output_path, str):
+            doc.save(output_path)
+            return output_path
+        
         try:
             doc.save(output_path)
         except PermissionError:
             output_path = f"report_{os.urandom(2).hex()}.docx"
             doc.save(output_path)
         
-        return output_path
\ No newline at end of file
+        return output_path
+
+    @staticmethod
+    def generate_docx_bytes(analysis_data: Dict[str, Any]) -> bytes:
+        """
+        生成 Word 报告并返回 docx 字节 (进程级 LRU 缓存)
+        
+        以分析结果的规范化 JSON 为缓存键，不同会话/线程打开同一份报告时只构建一次。
+        """
+        payload = json_utils.dumps(analysis_data, sort_keys=True, default=str)
+        return _docx_bytes_from_payload(payload)
+
+
+@lru_cache(maxsize=Config.DOCX_CACHE_SIZE)
+def _docx_bytes_from_payload(payload: bytes) -> bytes:
+    """按 JSON 载荷缓存最近生成的 docx 字节；淘汰旧报告以限制内存"""
+    buf = io.BytesIO()
+    ReportGenerator.generate_docx(json_utils.loads(payload), buf)
+    return buf.getvalue()
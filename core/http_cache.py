@@ -0,0 +1,72 @@
+"""
+HTTP Cache: 网页 / PDF 原始内容的条件请求缓存
+
+同一政策链接反复分析时，页面与附件 PDF 通常没有变化。这里把响应体连同 ETag / Last-Modified
+持久化到本地 (SQLite)；再次请求时带上 If-None-Match / If-Modified-Since，
+源站返回 304 即直接复用本地内容，省去下载并减轻政府网站压力。
+
+缓存的是原始字节而非解析后的正文，正文提取逻辑调整后无需重新下载。
+源站未提供任何校验头的响应不缓存 (无法确认是否变更)。
+PDF 可达十几 MB，总容量受 Config.HTTP_CACHE_MAX_BYTES 限制，超出时淘汰最久未用的条目。
+"""
+
+import os
+import sys
+from typing import Dict, Mapping, Optional
+
+try:
+    from config import Config
+except ImportError:
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from config import Config
+
+try:
+    from . import json_utils
+    from .cache import DiskCache
+except ImportError:
+    import json_utils
+    from cache import DiskCache
+
+_store = DiskCache(
+    os.path.join(Config.CACHE_DIR, "http_responses.sqlite"),
+    ttl=Config.HTTP_CACHE_TTL,
+    max_bytes=Config.HTTP_CACHE_MAX_BYTES
+)
+
+# 存储格式：元信息 JSON + NUL + 响应体 (JSON 序列化结果中不会出现原始 NUL 字节)
+_SEPARATOR = b"\0"
+
+
+def lookup(url: str) -> Optional[Dict]:
+    """返回 {"etag", "last_modified", "encoding", "body"}；未缓存返回 None"""
+    record = _store.get(url)
+    if record is None:
+        return None
+    meta, _, body = record.partition(_SEPARATOR)
+    entry = json_utils.loads(meta)
+    entry["body"] = body
+    return entry
+
+
+def validator_headers(entry: Optional[Dict]) -> Dict[str, str]:
+    """根据缓存条目生成条件请求头"""
+    headers = {}
+    if entry:
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+    return headers
+
+
+def store(url: str, response_headers: Mapping[str, str], body: bytes, encoding: Optional[str] = None) -> None:
+    """响应带有 ETag 或 Last-Modified 时写入缓存"""
+    etag = response_headers.get("ETag")
+    last_modified = response_headers.get("Last-Modified")
+    if not (etag or last_modified):
+        return
+    meta = json_utils.dumps({"etag": etag, "last_modified": last_modified, "encoding": encoding})
+    try:
+        _store.set(url, meta + _SEPARATOR + body)
+    except Exception as e:
+        print(f"⚠️ HTTP 缓存写入失败: {e}")
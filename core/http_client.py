@@ -0,0 +1,146 @@
+"""
+HTTP Client: 进程级共享连接池
+
+同步请求 (PDF 链接提取与 PDF 下载，见 pdf_extractor) 复用同一个 requests.Session (get_session，首次使用时创建)，keep-alive 连接跨调用共享，
+避免每次请求重新做 DNS + TCP + TLS 握手；并提供启动预热，首个真实请求即可复用已建立的连接。
+
+同步代码调用异步接口 (如 LLM 的 ainvoke) 时使用 run_sync：协程统一提交到一个常驻后台事件循环，
+异步客户端的连接池始终绑定同一个循环，避免每次 asyncio.run 新建/关闭循环导致连接失效。
+
+SerpApi 检索走 httpx.AsyncClient (get_async_client)，网页正文抓取见 web_loader，
+二者同样只在该后台循环中使用；安装了 h2 时启用 HTTP/2。
+
+所有请求默认校验 TLS 证书；个别证书不规范的站点需在 Config.TLS_INSECURE_HOSTS 中显式列出。
+"""
+
+import asyncio
+import os
+import sys
+import threading
+from urllib.parse import urlparse
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    from config import Config
+except ImportError:
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from config import Config
+
+try:
+    import h2  # noqa: F401  (httpx 的 HTTP/2 支持依赖 h2)
+    HAS_H2 = True
+except ImportError:
+    HAS_H2 = False
+
+# 每个域名保持的空闲连接数 (检索双路召回 + 组合分析并发抓取)
+POOL_MAXSIZE = 16
+
+# 启动时预热的域名
+WARMUP_URLS = ("https://serpapi.com/",)
+
+
+def default_headers() -> dict:
+    """请求头与 WebBaseLoader 默认值一致，避免被部分政府网站拒绝"""
+    from langchain_community.document_loaders.web_base import default_header_template
+
+    headers = default_header_template.copy()
+    if os.environ.get("USER_AGENT"):
+        headers["User-Agent"] = os.environ["USER_AGENT"]
+    return headers
+
+
+def tls_verify(url: str) -> bool:
+    """是否校验该 URL 的证书：仅 TLS_INSECURE_HOSTS 中列出的站点跳过"""
+    return urlparse(url).hostname not in Config.TLS_INSECURE_HOSTS
+
+
+def _build_session() -> requests.Session:
+    """创建带连接池的 Session"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=POOL_MAXSIZE, pool_maxsize=POOL_MAXSIZE)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update(default_headers())
+    return session
+
+
+def warmup(urls=WARMUP_URLS, timeout: float = 3) -> None:
+    """预先建立到常用域名的连接 (检索所用的异步客户端)；失败静默忽略，不影响正常请求"""
+    for url in urls:
+        try:
+            run_sync(get_async_client().head(url, timeout=timeout))
+            print(f"🔥 连接预热完成: {url}")
+        except Exception as e:
+            print(f"⚠️ 连接预热失败 (忽略): {url} {e}")
+
+
+def start_warmup() -> threading.Thread:
+    """在后台守护线程中执行预热，立即返回"""
+    thread = threading.Thread(target=warmup, name="http-warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    """惰性启动常驻后台事件循环 (守护线程)"""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="async-runner", daemon=True).start()
+    return _loop
+
+
+def run_sync(coro, timeout: float = None):
+    """
+    在后台事件循环中执行协程并阻塞等待结果 (可从任意线程调用)
+    
+    注意：协程运行在后台线程中，不能直接操作 Streamlit 组件。
+    """
+    return asyncio.run_coroutine_threadsafe(coro, _get_loop()).result(timeout)
+
+
+_async_client = None
+_client_lock = threading.Lock()
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """
+    共享的 httpx 异步客户端 (惰性创建)
+    
+    注意：连接池绑定事件循环，只能在 run_sync 的后台循环中使用。
+    """
+    global _async_client
+    with _client_lock:
+        if _async_client is None:
+            _async_client = httpx.AsyncClient(
+                http2=HAS_H2,
+                limits=httpx.Limits(max_connections=POOL_MAXSIZE, max_keepalive_connections=POOL_MAXSIZE),
+                timeout=15.0,
+                headers=default_headers(),
+            )
+    return _async_client
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """
+    共享的 requests.Session (惰性创建)
+    
+    请求头模板来自 langchain_community (导入较慢)，首次同步请求时才构建，不拖慢应用启动。
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = _build_session()
+    return _session
@@ -0,0 +1,48 @@
+"""
+JSON Utils: LLM 响应解析与序列化
+
+安装了 orjson 时使用其 Rust 实现解析/序列化 (比标准库 json 快数倍)，否则回退到标准库。
+orjson.JSONDecodeError 是 json.JSONDecodeError 的子类，调用方的异常处理无需区分。
+LLM 输出偶有尾逗号、截断等小的格式错误，安装了 json_repair 时由 loads_llm 修复后再解析。
+"""
+
+import json
+from typing import Any, Callable, Optional
+
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+try:
+    import json_repair
+    HAS_JSON_REPAIR = True
+except ImportError:
+    HAS_JSON_REPAIR = False
+
+
+def loads(s):
+    """解析 JSON 字符串 (str / bytes)"""
+    if HAS_ORJSON:
+        return orjson.loads(s)
+    return json.loads(s)
+
+
+def loads_llm(s):
+    """解析 LLM 输出的 JSON：正常情况与 loads 相同，解析失败时尝试修复 (未安装 json_repair 则照常抛出异常)"""
+    try:
+        return loads(s)
+    except json.JSONDecodeError:
+        if not HAS_JSON_REPAIR:
+            raise
+        print("⚠️ LLM 输出的 JSON 格式有误，尝试自动修复")
+        return loads(json_repair.repair_json(s))
+
+
+def dumps(obj: Any, sort_keys: bool = False, default: Optional[Callable[[Any], Any]] = None) -> bytes:
+    """序列化为 UTF-8 字节 (中文不转义)；sort_keys=True 时输出规范化，可用作缓存键"""
+    if HAS_ORJSON:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_SORT_KEYS if sort_keys else 0)
+        return orjson.dumps(obj, default=default, option=option)
+    return json.dumps(obj, sort_keys=sort_keys, ensure_ascii=False, default=default, separators=(",", ":")).encode()
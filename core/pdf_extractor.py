@@ -12,6 +12,12 @@ import requests
 from typing import List, Dict, Optional, Tuple
 from urllib.parse import urljoin, urlparse
 
+try:
+    from . import http_cache, http_client
+except ImportError:
+    import http_cache
+    import http_client
+
 # PDF 解析
 try:
     import fitz  # PyMuPDF
@@ -63,7 +69,7 @@ class PDFExtractor:
         
         try:
             if not html_content:
-                response = requests.get(page_url, headers=PDFExtractor.HEADERS, timeout=15, verify=False)
+                response = http_client.get_session().get(page_url, headers=PDFExtractor.HEADERS, timeout=15, verify=http_client.tls_verify(page_url))
                 response.encoding = response.apparent_encoding  # 修复编码问题
                 html_content = response.text
             
@@ -152,20 +158,25 @@ class PDFExtractor:
         try:
             print(f"📥 正在下载 PDF: {pdf_url}")
             
-            # 增加重定向跟踪，使用 Session 保持 cookies
-            session = requests.Session()
-            response = session.get(
+            # 增加重定向跟踪，复用共享 Session 的连接池与 cookies；本地有缓存时发条件请求，未变更则不重新下载
+            cached = http_cache.lookup(pdf_url)
+            response = http_client.get_session().get(
                 pdf_url, 
-                headers=PDFExtractor.HEADERS, 
+                headers={**PDFExtractor.HEADERS, **http_cache.validator_headers(cached)}, 
                 timeout=30, 
-                verify=False,
+                verify=http_client.tls_verify(pdf_url),
                 allow_redirects=True
             )
-            response.raise_for_status()
+            if cached is not None and response.status_code == 304:
+                print(f"  ♻️ PDF 未变更 (304)，使用本地缓存")
+                pdf_content = cached["body"]
+            else:
+                response.raise_for_status()
+                pdf_content = response.content
             
             content_type = response.headers.get('Content-Type', 'unknown')
             final_url = response.url  # 跟踪重定向后的最终 URL
-            file_size = len(response.content)
+            file_size = len(pdf_content)
             
             print(f"  📊 响应信息: 状态码={response.status_code}, 内容类型={content_type}, 大小={file_size/1024:.1f}KB")
             print(f"  🔗 最终URL: {final_url}")
@@ -182,7 +193,6 @@ class PDFExtractor:
                 return "", f"文件过小 ({file_size} 字节)，可能不是有效 PDF"
             
             # 核心修复：检查内容是否为有效 PDF (魔数验证)
-            pdf_content = response.content
             if not pdf_content.startswith(b'%PDF'):
                 # 检查是否是 HTML 错误页
                 if b'<html' in pdf_content[:500].lower() or b'<!doctype' in pdf_content[:500].lower():
@@ -194,6 +204,8 @@ class PDFExtractor:
                     return "", "下载的内容不是有效的 PDF 文件"
             
             print(f"  ✅ PDF 魔数验证通过，开始解析...")
+            if response.status_code != 304:
+                http_cache.store(pdf_url, response.headers, pdf_content)
             
             # 使用 PyMuPDF 解析
             doc = fitz.open(stream=pdf_content, filetype="pdf")
@@ -5,7 +5,9 @@ RAG Engine: 检索增强生成核心
 """
 
 import os
-from typing import List, Dict, Any
+import threading
+import numpy as np
+from typing import List, Dict, Any, Set
 from langchain_community.vectorstores import FAISS
 from langchain_openai import OpenAIEmbeddings
 from langchain_text_splitters import RecursiveCharacterTextSplitter
@@ -15,6 +17,14 @@ import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from config import Config
 
+try:
+    from .cache import LRUCache
+except ImportError:
+    from cache import LRUCache
+
+# 两个片段的 5-gram Jaccard 相似度达到该值即视为近似重复
+NEAR_DUPLICATE_THRESHOLD = 0.8
+
 class RAGEngine:
     """
     RAG 引擎：处理文档索引与检索
@@ -34,6 +44,10 @@ class RAGEngine:
             chunk_overlap=200,  # 增加重叠防止关键信息被切断
             separators=["\n\n", "\n", "。", "！", "？", " ", ""]
         )
+        
+        # 检索 query 的向量缓存：分析维度是固定的一组 query，只在首次使用时向量化；多个分析线程共享，读写加锁
+        self._query_vectors = LRUCache(maxsize=Config.QUERY_VECTOR_CACHE_SIZE)
+        self._query_vectors_lock = threading.Lock()
 
     def create_index(self, text: str):
         """
@@ -74,6 +88,58 @@ class RAGEngine:
             print(f"❌ 检索失败: {e}")
             return []
 
+    def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """
+        返回各 query 的向量：已缓存的直接复用，其余合并为一次 Embedding 请求
+        """
+        with self._query_vectors_lock:
+            cached = {q: self._query_vectors.get(q) for q in queries}
+        missing = list(dict.fromkeys(q for q, v in cached.items() if v is None))
+        if missing:
+            vectors = self.embeddings.embed_documents(missing)
+            with self._query_vectors_lock:
+                for q, v in zip(missing, vectors):
+                    self._query_vectors.put(q, v)
+                    cached[q] = v
+        return [cached[q] for q in queries]
+
+    def retrieve_by_vectors(self, vector_store, vectors: List[List[float]], k: int = 5) -> List[List[str]]:
+        """
+        按已计算好的查询向量批量检索最相关的文本块 (不再请求 Embedding 接口)：
+        所有 query 合并为一次 FAISS index.search 调用，返回与 vectors 一一对应的文本块列表
+        """
+        if not vector_store or not vectors:
+            return [[] for _ in vectors]
+        
+        try:
+            _, ids = vector_store.index.search(np.asarray(vectors, dtype="float32"), k)
+            return [
+                [vector_store.docstore.search(vector_store.index_to_docstore_id[i]).page_content for i in row if i >= 0]
+                for row in ids.tolist()
+            ]
+        except Exception as e:
+            print(f"❌ 检索失败: {e}")
+            return [[] for _ in vectors]
+
+    @staticmethod
+    def _shingles(text: str, n: int = 5) -> Set[str]:
+        return {text[i:i + n] for i in range(max(1, len(text) - n + 1))}
+
+    @classmethod
+    def _drop_near_duplicates(cls, chunks: List[str]) -> List[str]:
+        """
+        按字符 5-gram 的 Jaccard 相似度去除近似重复片段 (保留先出现的一个)。
+        不同转载版本、不同切片窗口常产生只差几个字的片段，重复送入 LLM 只会浪费 token
+        """
+        kept, kept_shingles = [], []
+        for chunk in chunks:
+            shingles = cls._shingles(chunk)
+            if any(len(shingles & other) >= NEAR_DUPLICATE_THRESHOLD * len(shingles | other) for other in kept_shingles):
+                continue
+            kept.append(chunk)
+            kept_shingles.append(shingles)
+        return kept
+
     def get_context_for_analysis(self, vector_store, queries: List[str], k: int = 3) -> str:
         """
         为多个分析维度获取综合上下文
@@ -85,14 +151,21 @@ class RAGEngine:
             print("⚠️ RAG: vector_store 为空，无法检索")
             return ""
         
+        # 各维度 query 的向量优先取缓存，缺失的一次性批量向量化，再在本地 FAISS 中一次批量检索
+        try:
+            query_vectors = self.embed_queries(queries)
+        except Exception as e:
+            print(f"❌ 检索失败 (query 向量化出错): {e}")
+            return ""
+        
         all_chunks = []
-        for q in queries:
-            chunks = self.retrieve_relevant_chunks(vector_store, q, k=k)
+        for q, chunks in zip(queries, self.retrieve_by_vectors(vector_store, query_vectors, k=k)):
             print(f"  🔎 Query '{q[:20]}...' -> 检索到 {len(chunks)} 个片段")
             all_chunks.extend(chunks)
         
-        # 去重并合并
-        unique_chunks = list(set(all_chunks))
+        # 去重并合并 (保持检索顺序，相同输入得到相同上下文，便于 LLM 响应缓存命中)：
+        # 先去掉完全相同的片段，再去掉与已保留片段高度重合的近似重复片段
+        unique_chunks = self._drop_near_duplicates(list(dict.fromkeys(all_chunks)))
         result = "\n---\n".join(unique_chunks)
         print(f"📊 RAG 检索汇总: 总 {len(all_chunks)} 个片段, 去重后 {len(unique_chunks)} 个, 共 {len(result)} 字符")
         return result
@@ -3,10 +3,10 @@ Ranking V4.0: Dual-Engine Hybrid Recall & AI Reasoning
 """
 
 import re
-import json
 import os
 import math
-from typing import List, Dict, Any, Optional
+from functools import lru_cache
+from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime
 from dataclasses import dataclass
 
@@ -21,12 +21,22 @@ except ImportError:
     sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
     from config import Config
 
+try:
+    from . import json_utils
+except ImportError:
+    import json_utils
+
 try:
     from rank_bm25 import BM25Okapi
     HAS_BM25 = True
 except ImportError:
     HAS_BM25 = False
 
+@lru_cache(maxsize=32)
+def _build_bm25(corpus: Tuple[Tuple[str, ...], ...]):
+    """同一候选集只建一次 BM25 索引（重排、强制刷新时复用）"""
+    return BM25Okapi([list(doc) for doc in corpus])
+
 @dataclass
 class ScoredPolicy:
     policy: Dict[str, Any]
@@ -74,22 +84,13 @@ class HybridRanker:
             temperature=0
         )
 
+    def preview(self, policies: List[Dict], query: str, top_k: int = 5) -> List[Dict]:
+        """仅按启发式分数 (排名/权威/BM25/时效) 给出前 top_k 条，不调用 LLM，供重排完成前先行展示"""
+        return [sp.policy for sp in self._heuristic_rank(policies, query)[:top_k]]
+
     def rank(self, policies: List[Dict], query: str, temperature: float = 0.0) -> List[Dict]:
         if not policies: return []
-        scored = [ScoredPolicy(policy=p) for p in policies]
-        for sp in scored:
-            rank_val = sp.policy.get("google_rank", 50)
-            sp.google_rank_score = 1.0 / math.log2(rank_val + 1)
-            sp.authority_score = self._calc_authority(sp.policy)
-            sp.format_bonus = self._calc_format_bonus(sp.policy)
-            sp.recency_score = self._calc_recency(sp.policy)
-        if HAS_BM25: self._calc_bm25_scores(scored, query)
-        self._calc_semantic_scores(scored, query)
-        for sp in scored:
-            rel = min(1.0, sp.authority_score + sp.format_bonus)
-            cont = (sp.bm25_score + sp.semantic_score) / 2
-            sp.final_score = 0.3 * sp.google_rank_score + 0.3 * cont + 0.3 * rel + 0.1 * sp.recency_score
-        scored.sort(key=lambda x: x.final_score, reverse=True)
+        scored = self._heuristic_rank(policies, query)
         candidates = scored[:15]
         self._llm_verify_policy(candidates, query, temperature=temperature)
         final_results = []
@@ -121,6 +122,27 @@ class HybridRanker:
         final_results.sort(key=lambda x: x["_scores"]["final"], reverse=True)
         return final_results
 
+    def _heuristic_rank(self, policies: List[Dict], query: str) -> List[ScoredPolicy]:
+        """启发式打分并按分数降序排列 (不调用 LLM)"""
+        scored = [ScoredPolicy(policy=p) for p in policies]
+        for sp in scored:
+            rank_val = sp.policy.get("google_rank", 50)
+            sp.google_rank_score = 1.0 / math.log2(rank_val + 1)
+            sp.authority_score = self._calc_authority(sp.policy)
+            sp.format_bonus = self._calc_format_bonus(sp.policy)
+            sp.recency_score = self._calc_recency(sp.policy)
+        # 候选文档只分词一次，BM25 与语义重叠度共用
+        doc_tokens = [tuple(self._tokenize(f"{sp.policy.get('title')} {sp.policy.get('snippet')}")) for sp in scored]
+        query_tokens = self._tokenize(query)
+        if HAS_BM25: self._calc_bm25_scores(scored, doc_tokens, query_tokens)
+        self._calc_semantic_scores(scored, doc_tokens, query_tokens)
+        for sp in scored:
+            rel = min(1.0, sp.authority_score + sp.format_bonus)
+            cont = (sp.bm25_score + sp.semantic_score) / 2
+            sp.final_score = 0.3 * sp.google_rank_score + 0.3 * cont + 0.3 * rel + 0.1 * sp.recency_score
+        scored.sort(key=lambda x: x.final_score, reverse=True)
+        return scored
+
     def _calc_format_bonus(self, policy: Dict) -> float:
         link = policy.get("link", "").lower()
         if link.endswith(".pdf"): return 0.20
@@ -149,18 +171,17 @@ class HybridRanker:
         if any(p in link for p in self.URL_DISCLOSURE_PATTERNS): score = 0.1
         return score
 
-    def _calc_bm25_scores(self, scored_list: List[ScoredPolicy], query: str):
-        corpus = [self._tokenize(f"{sp.policy.get('title')} {sp.policy.get('snippet')}") for sp in scored_list]
-        if not corpus: return
-        bm25 = BM25Okapi(corpus)
-        scores = bm25.get_scores(self._tokenize(query))
+    def _calc_bm25_scores(self, scored_list: List[ScoredPolicy], doc_tokens: List[Tuple[str, ...]], query_tokens: List[str]):
+        if not doc_tokens: return
+        bm25 = _build_bm25(tuple(doc_tokens))
+        scores = bm25.get_scores(query_tokens)
         max_s = max(scores) if max(scores) > 0 else 1
         for i, sp in enumerate(scored_list): sp.bm25_score = scores[i] / max_s
 
-    def _calc_semantic_scores(self, scored_list: List[ScoredPolicy], query: str):
-        q_tokens = set(self._tokenize(query))
-        for sp in scored_list:
-            t_tokens = set(self._tokenize(f"{sp.policy.get('title')} {sp.policy.get('snippet')}"))
+    def _calc_semantic_scores(self, scored_list: List[ScoredPolicy], doc_tokens: List[Tuple[str, ...]], query_tokens: List[str]):
+        q_tokens = set(query_tokens)
+        for sp, tokens in zip(scored_list, doc_tokens):
+            t_tokens = set(tokens)
             if not q_tokens or not t_tokens: sp.semantic_score = 0.0
             else: sp.semantic_score = len(q_tokens & t_tokens) / len(q_tokens | t_tokens)
 
@@ -213,7 +234,7 @@ Data:
             res = chain.invoke({"query": query, "data_list": data})
             match = re.search(r'\[.*\]', res, re.S)
             if match:
-                judgments = json.loads(match.group())
+                judgments = json_utils.loads_llm(match.group())
                 for j in judgments:
                     idx = j.get("index", 1) - 1
                     if 0 <= idx < len(candidates):
@@ -12,9 +12,10 @@ Router Agent: 意图识别与路由层
 - CHAT: 普通对话/查询状态
 """
 
-import json
 import os
+import re
 import sys
+from functools import lru_cache
 from typing import Dict, Any, List, Optional
 from dataclasses import dataclass
 from enum import Enum
@@ -22,9 +23,11 @@ from enum import Enum
 from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
+from langchain_core.messages import HumanMessage, SystemMessage
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from config import Config
+from core import json_utils
 
 
 class Intent(Enum):
@@ -53,6 +56,17 @@ class RouterAgent:
     路由 Agent：解析用户输入，识别意图，提取参数
     """
     
+    # 可直接由规则判定的输入 (命中时跳过 LLM 调用)
+    SELECT_PATTERN = re.compile(r"\d{1,3}(?:\s*[,，、\s]\s*\d{1,3})*")  # 纯序号，如 "1 3 5"、"2，4"
+    CLEAR_VERBS = ("清空", "清除", "重置")
+    COMBINED_COMMANDS = ("组合分析", "对比分析", "综合分析")
+    # 指令必须完整匹配，避免 "清除违规减持相关规定"、"对比分析科创板和创业板" 等检索请求被误判：
+    # 清空指令只允许附带暂存池/收藏等宾语；组合分析指令的侧重点须以冒号分隔，如 "组合分析：对中小企业的影响"
+    CLEAR_PATTERN = re.compile(f"(?:{'|'.join(map(re.escape, CLEAR_VERBS))})(?:暂存池?|收藏|暂存的政策)?")
+    COMBINED_PATTERN = re.compile(
+        f"(?:{'|'.join(map(re.escape, COMBINED_COMMANDS))})\\s*(?:[:：]\\s*(?P<direction>.*))?"
+    )
+    
     def __init__(self):
         self.llm = ChatOpenAI(
             api_key=Config.DASHSCOPE_API_KEY,
@@ -106,6 +120,30 @@ class RouterAgent:
 5. message 应该简短、友好，确认用户的操作意图
 """
 
+        self.keyword_prompt = """你是一名资深政策研究员。分析用户的模糊搜索需求，精准推理其可能寻找的官方政策文件。
+
+用户输入: {query}
+
+【你的任务】
+1. 分析用户搜索需求，提取其寻找的政策核心关键词。重点锁定“政策”、“管理办法”、“指引”、“实施细则”等深度合规文件。
+2. 生成优化后的搜索引擎查询词（refined_query）。
+   - **核心约束**：尽可能保留用户输入的原始术语，不要进行过度的词汇转换或过度排除词。
+   - **技巧**：保持查询词简洁有力。
+输出 JSON 格式：
+{{
+  "inferred_official_title": "推理出的官方文件全称"，否则为检索来源标题,
+  "keywords": ["核心术语1", "核心术语2"],
+  "time_range": "时间范围",
+  "source_preference": "gov 或 all",
+  "refined_query": "简洁的搜索词（如：基金从业人员管理办法 2024）"
+}}"""
+
+        # 提示词只构建一次，各次调用复用：
+        # 意图识别的 system 提示词含 JSON 示例 (未转义的花括号)，直接作为消息内容，不经模板解析；
+        # 关键词提取的模板只有 {query} 一个变量
+        self._system_message = SystemMessage(content=self.system_prompt)
+        self._keyword_prompt = ChatPromptTemplate.from_messages([("user", self.keyword_prompt)])
+
     def parse(self, user_input: str, context: Optional[Dict] = None) -> ParsedIntent:
         """
         解析用户输入，返回结构化的意图
@@ -117,6 +155,10 @@ class RouterAgent:
         Returns:
             ParsedIntent 对象
         """
+        quick = self._quick_parse(user_input, context)
+        if quick is not None:
+            return quick
+        
         context_str = ""
         if context:
             if context.get("search_results"):
@@ -124,29 +166,8 @@ class RouterAgent:
             if context.get("cached_policies"):
                 context_str += f"暂存池中的政策数量: {len(context['cached_policies'])} 条\n"
         
-        user_prompt = f"""请分析以下用户输入，识别意图并提取参数：
-
-【上下文信息】
-{context_str if context_str else "无"}
-
-【用户输入】
-{user_input}
-
-请输出 JSON 格式的分析结果。"""
-
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", self.system_prompt),
-            ("user", user_prompt)
-        ])
-        
-        chain = prompt | self.llm | StrOutputParser()
-        
         try:
-            response = chain.invoke({
-                "context_str": context_str if context_str else "无",
-                "user_input": user_input
-            })
-            result = json.loads(response)
+            result = self._parse_llm(user_input, context_str if context_str else "无")
             
             return ParsedIntent(
                 intent=Intent(result.get("intent", "CHAT")),
@@ -164,57 +185,100 @@ class RouterAgent:
                 message="正在为您检索..."
             )
 
+    def _quick_parse(self, user_input: str, context: Optional[Dict] = None) -> Optional[ParsedIntent]:
+        """规则预判：纯序号 / 清空 / 组合分析等明确指令直接返回意图，无法判定时返回 None"""
+        text = user_input.strip()
+        if self.SELECT_PATTERN.fullmatch(text):
+            indices = [int(x) for x in re.findall(r"\d+", text)]
+            return ParsedIntent(
+                intent=Intent.SELECT_ONLY,
+                select_indices=indices,
+                message=f"已暂存第 {'、'.join(map(str, indices))} 条"
+            )
+        if self.CLEAR_PATTERN.fullmatch(text):
+            return ParsedIntent(intent=Intent.CLEAR_CACHE, message="已清空暂存池")
+        command = self.COMBINED_PATTERN.fullmatch(text)
+        # 暂存池为空 (或未知) 时交给 LLM，由其给出提示而不是直接进入组合分析
+        if command and context and context.get("cached_policies"):
+            return ParsedIntent(
+                intent=Intent.ANALYZE_COMBINED,
+                analysis_direction=(command.group("direction") or "").strip() or None,
+                message="正在进行组合分析..."
+            )
+        return None
+
+    @lru_cache(maxsize=128)
+    def _parse_llm(self, user_input: str, context_str: str) -> Dict[str, Any]:
+        """
+        调用 LLM 解析意图，返回原始 JSON 字典
+        
+        相同 (输入, 上下文) 直接复用上次结果；解析失败时抛出异常，失败结果不会进入缓存。
+        调用方不得修改返回的字典。
+        """
+        user_prompt = f"""请分析以下用户输入，识别意图并提取参数：
+
+【上下文信息】
+{context_str}
+
+【用户输入】
+{user_input}
+
+请输出 JSON 格式的分析结果。"""
+
+        # 用户输入与上下文直接作为消息内容 (其中的花括号不会被当作模板变量)
+        response = self.llm.invoke([self._system_message, HumanMessage(content=user_prompt)])
+        return json_utils.loads_llm(response.content)
+
     def extract_keywords(self, query: str, temperature: float = 0.0) -> Dict[str, Any]:
         """
         从自然语言查询中提取结构化的搜索参数，并推理用户可能寻找的官方文件名称
         """
-        extract_prompt = """你是一名资深政策研究员。分析用户的模糊搜索需求，精准推理其可能寻找的官方政策文件。
+        try:
+            response = self._keyword_chain(temperature).invoke({"query": query})
+            return self._parse_keywords(response)
+        except Exception as e:
+            print(f"❌ 关键词提取失败: {e}")
+            return self._fallback_keywords(query)
 
-用户输入: {query}
+    async def aextract_keywords(self, query: str, temperature: float = 0.0) -> Dict[str, Any]:
+        """extract_keywords 的异步版本，便于与原始查询召回并发执行"""
+        try:
+            response = await self._keyword_chain(temperature).ainvoke({"query": query})
+            return self._parse_keywords(response)
+        except Exception as e:
+            print(f"❌ 关键词提取失败: {e}")
+            return self._fallback_keywords(query)
 
-【你的任务】
-1. 分析用户搜索需求，提取其寻找的政策核心关键词。重点锁定“政策”、“管理办法”、“指引”、“实施细则”等深度合规文件。
-2. 生成优化后的搜索引擎查询词（refined_query）。
-   - **核心约束**：尽可能保留用户输入的原始术语，不要进行过度的词汇转换或过度排除词。
-   - **技巧**：保持查询词简洁有力。
-输出 JSON 格式：
-{{
-  "inferred_official_title": "推理出的官方文件全称"，否则为检索来源标题,
-  "keywords": ["核心术语1", "核心术语2"],
-  "time_range": "时间范围",
-  "source_preference": "gov 或 all",
-  "refined_query": "简洁的搜索词（如：基金从业人员管理办法 2024）"
-}}"""
+    def _keyword_chain(self, temperature: float):
+        """构建关键词提取链"""
+        llm_with_temp = self.llm.bind(temperature=temperature)
+        return self._keyword_prompt | llm_with_temp | StrOutputParser()
 
-        prompt = ChatPromptTemplate.from_messages([
-            ("user", extract_prompt)
-        ])
+    @staticmethod
+    def _parse_keywords(response: str) -> Dict[str, Any]:
+        """解析关键词提取结果，并混合官方文件名与核心关键词"""
+        result = json_utils.loads_llm(response)
         
-        llm_with_temp = self.llm.bind(temperature=temperature)
-        chain = prompt | llm_with_temp | StrOutputParser()
+        # 优化：不再盲目覆盖，而是进行关键词混合
+        # 这样既能搜到精准文件名，也能兼容模糊关键词
+        inferred = result.get("inferred_official_title")
+        keywords = " ".join(result.get("keywords", []))
         
-        try:
-            response = chain.invoke({"query": query})
-            result = json.loads(response)
-            
-            # 优化：不再盲目覆盖，而是进行关键词混合
-            # 这样既能搜到精准文件名，也能兼容模糊关键词
-            inferred = result.get("inferred_official_title")
-            keywords = " ".join(result.get("keywords", []))
-            
-            if inferred and inferred != "null":
-                # 混合搜索：官方名 + 核心关键词
-                result["refined_query"] = f"{inferred} {keywords}".strip()
-            
-            return result
-        except Exception as e:
-            print(f"❌ 关键词提取失败: {e}")
-            return {
-                "keywords": [query],
-                "time_range": None,
-                "source_preference": "all",
-                "refined_query": query
-            }
+        if inferred and inferred != "null":
+            # 混合搜索：官方名 + 核心关键词
+            result["refined_query"] = f"{inferred} {keywords}".strip()
+        
+        return result
+
+    @staticmethod
+    def _fallback_keywords(query: str) -> Dict[str, Any]:
+        """提取失败时的降级参数：直接使用原始查询"""
+        return {
+            "keywords": [query],
+            "time_range": None,
+            "source_preference": "all",
+            "refined_query": query
+        }
 
 
 # 测试代码
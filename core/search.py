@@ -1,6 +1,9 @@
-import requests
+import asyncio
 import json
-from typing import List, Dict, Optional
+import time
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Optional, Tuple
 import sys
 import os
 
@@ -13,20 +16,46 @@ except ImportError:
     sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
     from config import Config
 
+try:
+    from . import http_client
+except ImportError:
+    import http_client
+
 class PolicySearcher:
     """
     负责联网检索 (Stage 1: Recall)
     """
     
+    # 单路查询响应的短期记忆：prefetch 提前发起的原始查询，在随后的 search 中直接复用
+    RESPONSE_MEMO_TTL = 120   # 秒
+    RESPONSE_MEMO_SIZE = 128
+    _response_memo: "OrderedDict[Tuple[str, int], Tuple[float, List[Dict]]]" = OrderedDict()
+    _memo_lock = threading.Lock()
+    
     @staticmethod
     def search(query: str, num_results: int = 50, 
                source_preference: str = "all", 
                time_range: Optional[str] = None,
-               raw_query: Optional[str] = None) -> List[Dict]:
+               raw_query: Optional[str] = None,
+               use_memo: bool = True) -> List[Dict]:
+        """asearch 的同步封装：提交到共享后台事件循环执行 (不可在该循环内部调用)"""
+        return http_client.run_sync(PolicySearcher.asearch(
+            query, num_results=num_results, source_preference=source_preference,
+            time_range=time_range, raw_query=raw_query, use_memo=use_memo
+        ))
+
+    @staticmethod
+    async def asearch(query: str, num_results: int = 50, 
+                      source_preference: str = "all", 
+                      time_range: Optional[str] = None,
+                      raw_query: Optional[str] = None,
+                      use_memo: bool = True) -> List[Dict]:
         """
         执行双向量搜索 (Stage 1: Multi-Vector Recall)
         1. 原始搜索: 信任 Google 的原生理解
         2. 精炼搜索: 使用 AI 处理后的关键词 + 站点限制
+        
+        use_memo=False 时不复用响应记忆 (强制刷新)，新结果仍写入记忆
         """
         queries_to_run = []
         
@@ -42,57 +71,96 @@ class PolicySearcher:
             refined_q += f" {time_range}"
         queries_to_run.append({"q": refined_q, "type": "refined"})
 
-        all_candidates = {} # url -> candidate_dict
+        # 多路查询互不依赖，并发执行：总耗时约等于最慢一路，而非各路之和
+        responses = await asyncio.gather(*(
+            PolicySearcher._fetch_organic(q_item, num_results, use_memo=use_memo) for q_item in queries_to_run
+        ))
 
-        for q_item in queries_to_run:
-            print(f"🔍 [SerpApi] 正在进行{q_item['type']}检索: {q_item['q']} ...")
-            
-            url = "https://serpapi.com/search"
-            params = {
-                "engine": "google",
-                "q": q_item['q'],
-                "api_key": Config.SERPER_API_KEY,
-                "gl": "cn",
-                "hl": "zh-cn",
-                "num": num_results
-            }
+        all_candidates = {} # url -> candidate_dict
 
-            try:
-                response = requests.get(url, params=params, timeout=15)
-                response.raise_for_status()
-                data = response.json()
-                raw_results = data.get("organic_results", [])
+        # 按查询顺序合并 (Raw 优先)，与串行执行时的去重结果一致
+        for q_item, raw_results in zip(queries_to_run, responses):
+            for idx, item in enumerate(raw_results):
+                link = item.get("link", "")
+                if not link: continue
                 
-                for idx, item in enumerate(raw_results):
-                    link = item.get("link", "")
-                    if not link: continue
-                    
-                    # 原始排名 (从1开始)
-                    rank = item.get("position", idx + 1)
-                    
-                    source_info = item.get("source", "")
-                    if not source_info and "displayed_link" in item:
-                        source_info = item["displayed_link"]
+                # 原始排名 (从1开始)
+                rank = item.get("position", idx + 1)
+                
+                source_info = item.get("source", "")
+                if not source_info and "displayed_link" in item:
+                    source_info = item["displayed_link"]
 
-                    # 如果 URL 已存在，保留更好的排名
-                    if link in all_candidates:
-                        if rank < all_candidates[link]['google_rank']:
-                            all_candidates[link]['google_rank'] = rank
-                    else:
-                        all_candidates[link] = {
-                            "title": item.get("title", ""),
-                            "link": link,
-                            "snippet": item.get("snippet", ""),
-                            "date": item.get("date", ""),
-                            "source": source_info,
-                            "google_rank": rank, # 记录 Google 原始排名
-                            "search_type": q_item['type']
-                        }
-            except Exception as e:
-                print(f"❌ 搜索 API 调用失败 [{q_item['type']}]: {e}")
+                # 如果 URL 已存在，保留更好的排名
+                if link in all_candidates:
+                    if rank < all_candidates[link]['google_rank']:
+                        all_candidates[link]['google_rank'] = rank
+                else:
+                    all_candidates[link] = {
+                        "title": item.get("title", ""),
+                        "link": link,
+                        "snippet": item.get("snippet", ""),
+                        "date": item.get("date", ""),
+                        "source": source_info,
+                        "google_rank": rank, # 记录 Google 原始排名
+                        "search_type": q_item['type']
+                    }
 
         # 转为列表并输出
         unique_candidates = list(all_candidates.values())
         print(f"📥 [SerpApi] 混合召回总量: {len(unique_candidates)} 条")
         
         return unique_candidates
+
+    @staticmethod
+    def prefetch(raw_query: str, num_results: int = 50) -> None:
+        """aprefetch 的同步封装"""
+        http_client.run_sync(PolicySearcher.aprefetch(raw_query, num_results))
+
+    @staticmethod
+    async def aprefetch(raw_query: str, num_results: int = 50) -> None:
+        """
+        提前执行原始查询 (不依赖关键词提取)，结果暂存在响应记忆中；
+        随后以相同 raw_query 调用 search 时该路查询不再重复联网
+        """
+        await PolicySearcher._fetch_organic({"q": raw_query, "type": "raw"}, num_results)
+
+    @staticmethod
+    async def _fetch_organic(q_item: Dict, num_results: int, use_memo: bool = True) -> List[Dict]:
+        """执行单路 SerpApi 查询，返回 organic_results；失败时返回空列表 (失败结果不记忆)"""
+        memo_key = (q_item['q'], num_results)
+        if use_memo:
+            with PolicySearcher._memo_lock:
+                hit = PolicySearcher._response_memo.get(memo_key)
+                if hit and time.monotonic() - hit[0] < PolicySearcher.RESPONSE_MEMO_TTL:
+                    print(f"♻️ [SerpApi] 复用{q_item['type']}检索结果: {q_item['q']}")
+                    return hit[1]
+        
+        print(f"🔍 [SerpApi] 正在进行{q_item['type']}检索: {q_item['q']} ...")
+        
+        url = "https://serpapi.com/search"
+        params = {
+            "engine": "google",
+            "q": q_item['q'],
+            "api_key": Config.SERPER_API_KEY,
+            "gl": "cn",
+            "hl": "zh-cn",
+            "num": num_results
+        }
+
+        try:
+            response = await http_client.get_async_client().get(url, params=params)
+            response.raise_for_status()
+            data = response.json()
+            organic = data.get("organic_results", [])
+        except Exception as e:
+            print(f"❌ 搜索 API 调用失败 [{q_item['type']}]: {e}")
+            return []
+
+        with PolicySearcher._memo_lock:
+            memo = PolicySearcher._response_memo
+            memo[memo_key] = (time.monotonic(), organic)
+            memo.move_to_end(memo_key)
+            while len(memo) > PolicySearcher.RESPONSE_MEMO_SIZE:
+                memo.popitem(last=False)
+        return organic
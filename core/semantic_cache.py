@@ -0,0 +1,146 @@
+"""
+Semantic Cache: LLM 响应的语义缓存
+
+精确缓存 (DiskCache) 只有输入逐字一致才命中；不同链接转载的同一份政策，
+其 RAG 检索到的原文条款往往几乎相同。这里以“标题 + 原文条款”的向量做余弦相似度检索，
+相似度达到阈值即复用此前的 LLM 响应。
+
+向量索引为 FAISS IndexFlatIP (向量先做 L2 归一化，内积即余弦相似度)，
+与响应元数据一起持久化到磁盘；未安装 faiss 时自动停用。
+条目数设有上限，写入时清理过期条目并淘汰最旧的条目；落盘按批进行 (每 SAVE_EVERY 次写入及进程退出时)。
+
+注意：内容几乎相同的不同版本政策也可能命中，默认停用 (Config.SEMANTIC_CACHE_ENABLED)。
+"""
+
+import atexit
+import os
+import threading
+import time
+from typing import List, Optional
+
+try:
+    from . import json_utils
+except ImportError:
+    import json_utils
+
+try:
+    import faiss
+    import numpy as np
+    HAS_FAISS = True
+except ImportError:
+    HAS_FAISS = False
+
+
+class SemanticCache:
+    """按向量相似度查找已缓存的 LLM 响应 (字符串)；多线程共享，读写加锁"""
+
+    # 每次检索的候选数：最近邻已过期时继续查看后面的候选
+    SEARCH_K = 8
+    # 累计多少次写入后落盘一次
+    SAVE_EVERY = 8
+
+    def __init__(self, path_prefix: str, threshold: float, ttl: float, maxsize: int = 512):
+        self.index_path = path_prefix + ".faiss"
+        self.meta_path = path_prefix + ".json"
+        self.threshold = threshold
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._index = None
+        self._entries: List[dict] = []  # 与索引中的向量一一对应 (按写入时间先后): {"response": str, "ts": float}
+        self._unsaved = 0
+        if HAS_FAISS:
+            self._load()
+            atexit.register(self.flush)
+
+    def _load(self):
+        if not (os.path.exists(self.index_path) and os.path.exists(self.meta_path)):
+            return
+        try:
+            index = faiss.read_index(self.index_path)
+            with open(self.meta_path, "rb") as f:
+                entries = json_utils.loads(f.read())
+            if index.ntotal == len(entries):
+                self._index, self._entries = index, entries
+        except Exception as e:
+            print(f"⚠️ 语义缓存加载失败，将重新建立: {e}")
+
+    def flush(self) -> None:
+        """把尚未落盘的写入保存到磁盘"""
+        if not HAS_FAISS:
+            return
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if not self._unsaved or self._index is None:
+            return
+        try:
+            self._save()
+            self._unsaved = 0
+        except Exception as e:
+            print(f"⚠️ 语义缓存写盘失败: {e}")
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.index_path) or ".", exist_ok=True)
+        faiss.write_index(self._index, self.index_path)
+        with open(self.meta_path, "wb") as f:
+            f.write(json_utils.dumps(self._entries))
+
+    @staticmethod
+    def _normalize(vector: List[float]):
+        v = np.asarray(vector, dtype="float32").reshape(1, -1)
+        faiss.normalize_L2(v)
+        return v
+
+    def lookup(self, vector: List[float]) -> Optional[str]:
+        """返回最相似且未过期、相似度不低于阈值的响应，否则 None"""
+        if not HAS_FAISS:
+            return None
+        with self._lock:
+            if self._index is None or self._index.ntotal == 0 or self._index.d != len(vector):
+                return None
+            k = min(self.SEARCH_K, self._index.ntotal)
+            scores, ids = self._index.search(self._normalize(vector), k)
+            now = time.time()
+            # 结果按相似度降序排列：低于阈值即可停止，已过期的候选跳过
+            for score, idx in zip(scores[0].tolist(), ids[0].tolist()):
+                if idx < 0 or score < self.threshold:
+                    break
+                entry = self._entries[idx]
+                if now - entry["ts"] <= self.ttl:
+                    print(f"♻️ 语义缓存命中 (相似度 {score:.3f})")
+                    return entry["response"]
+            return None
+
+    def add(self, vector: List[float], response: str) -> None:
+        if not HAS_FAISS:
+            return
+        with self._lock:
+            if self._index is None:
+                self._index = faiss.IndexFlatIP(len(vector))
+            elif self._index.d != len(vector):
+                return  # 向量维度变化 (更换了 Embedding 模型)，不混入旧索引
+            self._prune(reserve=1)
+            self._index.add(self._normalize(vector))
+            self._entries.append({"response": response, "ts": time.time()})
+            self._unsaved += 1
+            if self._unsaved >= self.SAVE_EVERY:
+                self._flush_locked()
+
+    def _prune(self, reserve: int = 0) -> None:
+        """移除过期条目，并按写入先后淘汰最旧的条目，为 reserve 条新写入留出容量 (调用方持锁)"""
+        now = time.time()
+        keep = [i for i, e in enumerate(self._entries) if now - e["ts"] <= self.ttl]
+        overflow = len(keep) + reserve - self.maxsize
+        if overflow > 0:
+            keep = keep[overflow:]
+        if len(keep) == len(self._entries):
+            return
+        vectors = self._index.reconstruct_n(0, self._index.ntotal)
+        index = faiss.IndexFlatIP(self._index.d)
+        if keep:
+            index.add(vectors[keep])
+        self._index = index
+        self._entries = [self._entries[i] for i in keep]
+        self._unsaved += 1  # 索引已变化，需要落盘
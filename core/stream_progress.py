@@ -0,0 +1,48 @@
+"""
+Stream Progress: 流式生成报告时的进度估算
+
+单政策分析与组合分析都以流式方式接收 LLM 输出的报告 JSON：
+按已收到的字数在给定区间内推进进度条，输出中出现报告各部分的字段名时切换阶段文案。
+"""
+
+from typing import Callable, Optional, Sequence, Tuple
+
+# 流式输出中的字段名 → 阶段文案 (顺序与两份提示词中的 JSON 格式一致)
+REPORT_MILESTONES = (
+    ('"chat_bullets"', "💡 正在提炼核心观点..."),
+    ('"docx_content"', "📝 正在撰写报告正文..."),
+)
+
+# 保留上一块末尾的字数：字段名可能被切分在相邻两块之间
+_TAIL_CHARS = 32
+
+
+class StreamProgress:
+    """逐块喂入输出文本，进度或阶段文案变化时调用 stage_callback(文案, 百分比)"""
+
+    def __init__(self, stage_callback: Optional[Callable[[str, int], None]], stage_msg: str,
+                 start: int, end: int, expected_chars: int,
+                 milestones: Sequence[Tuple[str, str]] = REPORT_MILESTONES):
+        self.stage_callback = stage_callback
+        self.stage_msg = stage_msg
+        self.start = start
+        self.span = end - start  # 进度最多推进到 end，之后的收尾阶段由调用方报告
+        self.expected_chars = expected_chars
+        self._milestones = list(milestones)
+        self._received = 0
+        self._last_p = start
+        self._tail = ""
+
+    def feed(self, text: str) -> None:
+        self._received += len(text)
+        p = self.start + min(self.span, self.span * self._received // self.expected_chars)
+        stage_changed = False
+        if self._milestones:
+            window = self._tail + text
+            while self._milestones and self._milestones[0][0] in window:
+                self.stage_msg = self._milestones.pop(0)[1]
+                stage_changed = True
+            self._tail = window[-_TAIL_CHARS:]
+        if self.stage_callback and (p != self._last_p or stage_changed):
+            self.stage_callback(self.stage_msg, p)
+            self._last_p = p
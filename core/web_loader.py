@@ -0,0 +1,139 @@
+"""
+Web Loader: 异步网页正文抓取
+
+替代逐个阻塞执行的 WebBaseLoader：基于共享的 httpx.AsyncClient，
+多篇政策原文可在同一事件循环中用 asyncio.gather 并发抓取。
+正文提取优先使用 selectolax (C 实现，比 BeautifulSoup 快数倍)，未安装时回退到 BeautifulSoup.get_text；
+两者都预先剔除导航、页脚、脚本等样板标签、丢弃空行，减少送入 LLM 的无效字符。
+解析在线程中执行，不阻塞并发抓取所在的事件循环。
+
+正文按 URL 缓存 (LRU + TTL)，同一政策先单独分析、再参与组合分析时不再重复抓取；
+原始页面另有持久化的条件请求缓存 (http_cache)，页面未变更时源站返回 304，无需重新下载。
+
+注意：与 http_client.get_async_client 相同，连接池绑定 run_sync 的后台事件循环；
+缓存也只在该循环线程中读写，无需加锁。
+"""
+
+import asyncio
+import os
+import sys
+import threading
+from typing import Optional, Tuple, Union
+
+import httpx
+from bs4 import BeautifulSoup
+
+try:
+    from selectolax.parser import HTMLParser
+    HAS_SELECTOLAX = True
+except ImportError:
+    HAS_SELECTOLAX = False
+
+try:
+    from config import Config
+except ImportError:
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from config import Config
+
+try:
+    from . import http_client, http_cache
+    from .cache import LRUCache
+except ImportError:
+    import http_client
+    import http_cache
+    from cache import LRUCache
+
+_client = None
+_client_lock = threading.Lock()
+_page_cache = LRUCache(maxsize=Config.PAGE_CACHE_SIZE, ttl=Config.PAGE_CACHE_TTL)
+
+# 建连单独限时：不可达的站点尽快失败，不占满整个读取超时
+CONNECT_TIMEOUT = 5.0
+
+# 不含正文的样板标签 (导航栏、页脚、侧栏、脚本样式等)；header/form 可能包裹正文 (如 ASP.NET 页面整体在 form 内)，保留
+BOILERPLATE_TAGS = ["script", "style", "noscript", "nav", "footer", "aside", "iframe", "svg"]
+
+
+def _get_client() -> httpx.AsyncClient:
+    """
+    网页抓取专用客户端：默认校验证书 (常驻连接池可复用 TLS 会话，重复抓取同一站点无需完整握手)；
+    Config.TLS_INSECURE_HOSTS 中证书不规范的站点挂载单独的不校验传输层
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            limits = httpx.Limits(
+                max_connections=http_client.POOL_MAXSIZE,
+                max_keepalive_connections=http_client.POOL_MAXSIZE
+            )
+            insecure_transport = httpx.AsyncHTTPTransport(verify=False, http2=http_client.HAS_H2, limits=limits)
+            _client = httpx.AsyncClient(
+                http2=http_client.HAS_H2,
+                follow_redirects=True,
+                timeout=httpx.Timeout(15.0, connect=CONNECT_TIMEOUT),
+                limits=limits,
+                headers=http_client.default_headers(),
+                mounts={f"all://{host}": insecure_transport for host in Config.TLS_INSECURE_HOSTS},
+            )
+    return _client
+
+
+def _decode_markup(body: bytes, encoding: Optional[str]) -> Union[str, bytes]:
+    """响应头声明了编码时按其解码；否则返回原始字节，交给 BeautifulSoup 按 <meta charset> 等自动识别 (常见 GBK 页面)"""
+    return body.decode(encoding, errors="replace") if encoding else body
+
+
+def _markup_to_text(markup: Union[str, bytes]) -> str:
+    if HAS_SELECTOLAX:
+        # 字节输入时 selectolax 同样按 <meta charset> 识别编码
+        tree = HTMLParser(markup)
+        for node in tree.css(",".join(BOILERPLATE_TAGS)):
+            node.decompose()
+        root = tree.body or tree.root
+        text = root.text() if root is not None else ""
+    else:
+        soup = BeautifulSoup(markup, "html.parser")
+        for tag in soup(BOILERPLATE_TAGS):
+            tag.decompose()
+        text = soup.get_text()
+    lines = (line.strip() for line in text.splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+async def afetch_text(url: str, timeout: float = 15) -> str:
+    """抓取网页并返回纯文本 (命中缓存时不联网)；HTTP 错误与网络异常直接抛出且不缓存，由调用方决定降级方式"""
+    text = _page_cache.get(url)
+    if text is not None:
+        print(f"♻️ 复用已抓取的网页内容: {url}")
+        return text
+    _, text = await afetch_page(url, timeout=timeout)
+    return text
+
+
+async def afetch_page(url: str, timeout: float = 15) -> Tuple[Union[str, bytes], str]:
+    """
+    抓取网页 (总是联网)，同时返回原始 HTML 与正文文本；正文写入缓存。
+    供既要解析页面结构 (如查找 PDF 附件链接) 又要正文的调用方只请求一次页面。
+    """
+    cached = http_cache.lookup(url)
+    response = await _get_client().get(
+        url,
+        headers=http_cache.validator_headers(cached),
+        timeout=httpx.Timeout(timeout, connect=CONNECT_TIMEOUT)
+    )
+    if cached is not None and response.status_code == 304:
+        print(f"♻️ 页面未变更 (304)，使用本地缓存: {url}")
+        body, encoding = cached["body"], cached["encoding"]
+    else:
+        response.raise_for_status()
+        body, encoding = response.content, response.charset_encoding
+        http_cache.store(url, response.headers, body, encoding)
+    markup = _decode_markup(body, encoding)
+    text = await asyncio.to_thread(_markup_to_text, markup)
+    _page_cache.put(url, text)
+    return markup, text
+
+
+def fetch_page(url: str, timeout: float = 15) -> Tuple[Union[str, bytes], str]:
+    """afetch_page 的同步封装 (提交到共享后台事件循环，不可在该循环内部调用)"""
+    return http_client.run_sync(afetch_page(url, timeout=timeout))
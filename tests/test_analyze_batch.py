@@ -0,0 +1,72 @@
+import sys
+import os
+import asyncio
+import tempfile
+import threading
+import time
+
+# ---------------------------------------------------------
+# 环境设置：确保能导入 core 模块；以下测试不联网，API Key 仅用于通过客户端构造
+# ---------------------------------------------------------
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault("DASHSCOPE_API_KEY", "offline-test")
+os.environ.setdefault("CACHE_DIR", tempfile.mkdtemp(prefix="policy_cache_"))
+
+try:
+    from core import http_client
+    from core.analyzer import PolicyAnalyzer
+except ImportError as e:
+    print(f"❌ 错误: 无法导入 core 模块 ({e})。请确保目录结构正确且依赖已安装。")
+    sys.exit(1)
+
+
+def test_batch_larger_than_semaphore():
+    """
+    批量数超过并发上限时全部完成且不死锁：模拟 analyze 的真实调用结构
+    (工作线程中经 run_sync 回到共享循环，再占用循环的默认线程池解析正文)
+    """
+    # 并发上限取默认线程池的线程数：分析若占用默认线程池，所有线程都会阻塞在 run_sync 上
+    limit = min(32, (os.cpu_count() or 1) + 4)
+    policies = [{"title": f"政策{i}", "link": f"https://example.com/{i}"} for i in range(limit + 3)]
+    policies[2]["fail"] = True
+
+    running, peak = 0, 0
+    lock = threading.Lock()
+
+    def fake_analyze(policy, stage_callback=None):
+        nonlocal running, peak
+        with lock:
+            running += 1
+            peak = max(peak, running)
+        try:
+            # 与 fetch_page → afetch_page → asyncio.to_thread(_markup_to_text) 的结构一致
+            http_client.run_sync(asyncio.to_thread(time.sleep, 0.05), timeout=5)
+            if stage_callback:
+                stage_callback("📄 正在检测 PDF 政策原文...", 10)
+            if policy.get("fail"):
+                raise RuntimeError("抓取失败")
+            return {"title": policy["title"]}
+        finally:
+            with lock:
+                running -= 1
+
+    analyzer = PolicyAnalyzer()
+    analyzer.analyze = fake_analyze
+    messages = []
+
+    results = http_client.run_sync(
+        analyzer.aanalyze_batch(policies, lambda msg, p: messages.append(msg), max_concurrency=limit),
+        timeout=20
+    )
+
+    assert len(results) == len(policies), "❌ 失败: 结果数与输入不一致"
+    assert results[2] == {"error": "抓取失败"}, "❌ 失败: 单篇失败未转为 error 结果"
+    assert [r["title"] for i, r in enumerate(results) if i != 2] == \
+        [p["title"] for i, p in enumerate(policies) if i != 2], "❌ 失败: 结果顺序与输入不一致"
+    assert peak <= limit, f"❌ 失败: 同时进行的分析数 {peak} 超过上限 {limit}"
+    assert f"[1/{len(policies)}] 📄 正在检测 PDF 政策原文..." in messages, "❌ 失败: 进度文案未带政策序号"
+    print(f"✅ 批量分析 {len(policies)} 篇 (并发上限 {limit}) 完成，峰值并发 {peak}")
+
+
+if __name__ == "__main__":
+    test_batch_larger_than_semaphore()
@@ -0,0 +1,91 @@
+import sys
+import os
+import json
+import tempfile
+
+# ---------------------------------------------------------
+# 环境设置：确保能导入 core 模块；以下测试不联网，API Key 仅用于通过客户端构造
+# ---------------------------------------------------------
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault("DASHSCOPE_API_KEY", "offline-test")
+os.environ.setdefault("CACHE_DIR", tempfile.mkdtemp(prefix="policy_cache_"))
+
+try:
+    from langchain_core.messages import AIMessageChunk
+    from core import compare_agent
+    from core.compare_agent import CompareAgent
+except ImportError as e:
+    print(f"❌ 错误: 无法导入 core 模块 ({e})。请确保目录结构正确且依赖已安装。")
+    sys.exit(1)
+
+
+def _search_results(snippet_suffix=""):
+    """检索结果只有 snippet 字段，没有 summary"""
+    return [
+        {"title": "上市公司股东减持股份管理暂行办法", "source": "证监会", "date": "2024-05-24",
+         "link": "http://www.csrc.gov.cn/a", "snippet": "规范大股东减持行为" + snippet_suffix},
+        {"title": "上市公司现金分红指引", "source": "证监会", "date": "2024-04-01",
+         "link": "http://www.csrc.gov.cn/b", "snippet": "鼓励上市公司增加现金分红"},
+    ]
+
+
+class _FakeLLM:
+    """按调用次数计数的流式模型，返回固定的报告 JSON"""
+    temperature = 0.15
+
+    def __init__(self):
+        self.calls = 0
+
+    async def astream(self, messages):
+        self.calls += 1
+        yield AIMessageChunk(content=json.dumps({"chat_bullets": ["观点"], "docx_content": {"政策共同导向": ["段落"]}}))
+
+
+def test_cache_key_follows_rendered_prompt():
+    """缓存键取提示词实际呈现的值：snippet 变化即视为不同分析，未呈现的字段不影响键"""
+    agent = CompareAgent()
+    base = agent._cache_key(_search_results(), None)
+
+    assert base == agent._cache_key(_search_results(), None), "❌ 失败: 相同输入的缓存键不一致"
+    assert base != agent._cache_key(_search_results("，设置减持比例限制"), None), "❌ 失败: snippet 不同却共用缓存键"
+    assert base != agent._cache_key(_search_results()[::-1], None), "❌ 失败: 政策顺序不同却共用缓存键"
+    assert base != agent._cache_key(_search_results(), "对中小企业的影响"), "❌ 失败: 侧重方向不同却共用缓存键"
+
+    # 有 summary 时提示词只呈现 summary，snippet 不再影响缓存键
+    with_summary = [dict(p, summary="摘要") for p in _search_results()]
+    with_summary_changed = [dict(p, summary="摘要") for p in _search_results("，设置减持比例限制")]
+    assert agent._cache_key(with_summary, None) == agent._cache_key(with_summary_changed, None), \
+        "❌ 失败: 未呈现在提示词中的字段影响了缓存键"
+    # 额外的展示字段 (如 _display_*) 不影响缓存键
+    decorated = [dict(p, _display_meta="📅 2024") for p in _search_results()]
+    assert agent._cache_key(decorated, None) == base, "❌ 失败: 展示字段影响了缓存键"
+    print("✅ 组合分析缓存键与提示词内容一致")
+
+
+def test_cache_hit_skips_llm():
+    """同一组政策第二次分析直接命中缓存；snippet 变化后重新调用模型"""
+    async def fake_fetch(url, timeout=10):
+        return f"{url} 原文"
+
+    original_fetch = compare_agent.afetch_text
+    compare_agent.afetch_text = fake_fetch
+    try:
+        agent = CompareAgent()
+        agent.llm = _FakeLLM()
+        direction = f"缓存测试-{os.getpid()}"  # 避免命中其它测试进程写入的结果
+
+        first = agent.analyze(_search_results(), user_direction=direction)
+        second = agent.analyze(_search_results(), user_direction=direction)
+        assert "error" not in first and first == second, "❌ 失败: 缓存结果与首次分析不一致"
+        assert agent.llm.calls == 1 and agent.cache_hits == 1, "❌ 失败: 第二次分析未命中缓存"
+
+        agent.analyze(_search_results("，设置减持比例限制"), user_direction=direction)
+        assert agent.llm.calls == 2, "❌ 失败: snippet 变化后仍命中旧缓存"
+    finally:
+        compare_agent.afetch_text = original_fetch
+    print("✅ 组合分析缓存命中与失效正常")
+
+
+if __name__ == "__main__":
+    test_cache_key_follows_rendered_prompt()
+    test_cache_hit_skips_llm()
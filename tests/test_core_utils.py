@@ -0,0 +1,143 @@
+import sys
+import os
+import tempfile
+import time
+
+# ---------------------------------------------------------
+# 环境设置：确保能导入 core 模块；以下测试均不联网，API Key 仅用于通过客户端构造
+# ---------------------------------------------------------
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault("DASHSCOPE_API_KEY", "offline-test")
+os.environ.setdefault("CACHE_DIR", tempfile.mkdtemp(prefix="policy_cache_"))
+
+try:
+    from core import json_utils
+    from core.cache import LRUCache, DiskCache
+    from core.router_agent import RouterAgent, Intent
+    from core.web_loader import _decode_markup, _markup_to_text
+    from core.rag_engine import RAGEngine
+except ImportError as e:
+    print(f"❌ 错误: 无法导入 core 模块 ({e})。请确保目录结构正确且依赖已安装。")
+    sys.exit(1)
+
+
+def test_lru_cache():
+    """LRU：超出容量淘汰最久未使用的条目；过期条目读取时视为未命中"""
+    cache = LRUCache(maxsize=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")  # a 变为最近使用
+    cache.put("c", 3)
+    assert "b" not in cache, "❌ 失败: 最久未使用的条目未被淘汰"
+    assert cache.get("a") == 1 and cache.get("c") == 3, "❌ 失败: 最近使用的条目被误淘汰"
+    assert len(cache) == 2
+
+    cache = LRUCache(maxsize=4, ttl=0.05)
+    cache.put("k", "v")
+    assert cache.get("k") == "v"
+    time.sleep(0.1)
+    assert cache.get("k", "miss") == "miss", "❌ 失败: 过期条目仍被命中"
+    assert len(cache) == 0, "❌ 失败: 过期条目未被删除"
+    print("✅ LRUCache 容量淘汰与 TTL 正常")
+
+
+def test_disk_cache_round_trip():
+    """DiskCache：字符串与字节原样取回，类型不变"""
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = DiskCache(os.path.join(tmp, "test.sqlite"), ttl=60)
+        text = "《上市公司股东减持股份管理暂行办法》" * 50
+        body = b"%PDF-1.7\x00\xff" * 50
+        cache.set("text", text)
+        cache.set("bytes", body)
+        assert cache.get("text") == text and isinstance(cache.get("text"), str), "❌ 失败: 字符串未原样取回"
+        assert cache.get("bytes") == body and isinstance(cache.get("bytes"), bytes), "❌ 失败: 字节未原样取回"
+        cache.delete("text")
+        assert cache.get("text") is None, "❌ 失败: 删除后仍可命中"
+        assert cache.get("missing") is None
+    print("✅ DiskCache 字符串/字节往返正常")
+
+
+def test_json_loads():
+    """loads 严格解析；loads_llm 对合法 JSON 结果一致，非法输入在无法修复时抛出异常"""
+    raw = '{"title": "减持新规", "items": [1, 2]}'
+    assert json_utils.loads(raw) == json_utils.loads_llm(raw) == {"title": "减持新规", "items": [1, 2]}
+    assert json_utils.loads(json_utils.dumps({"a": "中文"})) == {"a": "中文"}, "❌ 失败: dumps/loads 往返不一致"
+
+    broken = '{"title": "减持新规", "items": [1, 2],}'
+    try:
+        json_utils.loads(broken)
+        assert False, "❌ 失败: loads 接受了非法 JSON"
+    except ValueError:
+        pass
+    if json_utils.HAS_JSON_REPAIR:
+        assert json_utils.loads_llm(broken)["title"] == "减持新规", "❌ 失败: loads_llm 未修复 JSON"
+    else:
+        try:
+            json_utils.loads_llm(broken)
+            assert False, "❌ 失败: 未安装 json_repair 时 loads_llm 应抛出异常"
+        except ValueError:
+            pass
+    print("✅ loads / loads_llm 行为符合预期")
+
+
+def test_router_quick_parse():
+    """规则预判只接管完整指令，含指令词的检索请求交给 LLM"""
+    router = RouterAgent()
+    cart = {"cached_policies": [{"title": "测试政策"}]}
+
+    # 检索请求不得被当作指令
+    for query in ("清除违规减持相关规定", "对比分析科创板和创业板上市规则", "综合分析一下2024年减持新规的影响"):
+        assert router._quick_parse(query, cart) is None, f"❌ 失败: 检索请求被误判为指令: {query}"
+
+    assert router._quick_parse("1, 3").intent == Intent.SELECT_ONLY
+    assert router._quick_parse("1, 3").select_indices == [1, 3]
+    assert router._quick_parse("清空暂存池").intent == Intent.CLEAR_CACHE
+
+    parsed = router._quick_parse("组合分析：对中小企业的影响", cart)
+    assert parsed.intent == Intent.ANALYZE_COMBINED, "❌ 失败: 组合分析指令未命中"
+    assert parsed.analysis_direction == "对中小企业的影响", "❌ 失败: 分析侧重点提取错误"
+    assert router._quick_parse("对比分析", cart).analysis_direction is None
+    assert router._quick_parse("对比分析", {"cached_policies": []}) is None, "❌ 失败: 暂存池为空时不应直接组合分析"
+    print("✅ Router 规则预判正常")
+
+
+def test_gbk_markup_decoding():
+    """未声明编码的 GBK 页面按 <meta charset> 识别；声明了编码时按声明解码"""
+    html = '<html><head><meta charset="gbk"><title>t</title></head><body><script>var a=1;</script><p>证监会发布减持新规</p></body></html>'
+    body = html.encode("gbk")
+
+    markup = _decode_markup(body, None)
+    assert isinstance(markup, bytes), "❌ 失败: 未声明编码时应保留原始字节"
+    text = _markup_to_text(markup)
+    assert "证监会发布减持新规" in text, f"❌ 失败: GBK 页面解码错误: {text!r}"
+    assert "var a" not in text, "❌ 失败: 脚本内容未被去除"
+
+    assert "证监会发布减持新规" in _markup_to_text(_decode_markup(body, "gbk"))
+    print("✅ GBK 网页解码正常")
+
+
+def test_drop_near_duplicates():
+    """只差几个字的片段只保留先出现的一个，不相关的片段保留"""
+    base = (
+        "第十条 上市公司大股东减持股份的，应当在首次卖出前十五个交易日向证券交易所报告并披露减持计划。"
+        "减持计划的内容应当包括拟减持股份的数量、来源、减持时间区间、价格区间、方式和原因。"
+        "每次披露的减持时间区间不得超过三个月。"
+    )
+    chunks = [
+        base,
+        base.replace("三个月", "3个月"),  # 不同转载版本的细微差异
+        "第二十条 违反本办法规定减持股份的，由中国证监会责令改正，并依法予以处罚。",
+    ]
+    kept = RAGEngine._drop_near_duplicates(chunks)
+    assert kept == [chunks[0], chunks[2]], f"❌ 失败: 近似重复过滤结果错误: {kept}"
+    print("✅ 近似重复片段过滤正常")
+
+
+if __name__ == "__main__":
+    test_lru_cache()
+    test_disk_cache_round_trip()
+    test_json_loads()
+    test_router_quick_parse()
+    test_gbk_markup_decoding()
+    test_drop_near_duplicates()
+    print("\n✨ 所有测试通过！")
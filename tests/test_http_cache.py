@@ -0,0 +1,94 @@
+import sys
+import os
+import tempfile
+import time
+
+# ---------------------------------------------------------
+# 环境设置：确保能导入 core 模块；以下测试不联网 (httpx.MockTransport 模拟源站)
+# ---------------------------------------------------------
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault("DASHSCOPE_API_KEY", "offline-test")
+os.environ.setdefault("CACHE_DIR", tempfile.mkdtemp(prefix="policy_cache_"))
+
+try:
+    import httpx
+    from core import http_client, http_cache, web_loader
+    from core.cache import DiskCache
+except ImportError as e:
+    print(f"❌ 错误: 无法导入 core 模块 ({e})。请确保目录结构正确且依赖已安装。")
+    sys.exit(1)
+
+
+PAGE_HTML = '<html><head><meta charset="utf-8"></head><body><p>证监会发布减持新规</p></body></html>'.encode("utf-8")
+
+
+def test_conditional_get_reuses_cached_body():
+    """首次抓取保存 ETag 与页面；再次抓取带 If-None-Match，源站返回 304 时使用本地页面"""
+    url = f"https://www.csrc.gov.cn/test/{os.getpid()}-{time.time_ns()}.shtml"
+    requests_seen = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests_seen.append(request)
+        if request.headers.get("If-None-Match") == '"v1"':
+            return httpx.Response(304, headers={"ETag": '"v1"'})
+        return httpx.Response(200, headers={"ETag": '"v1"', "Content-Type": "text/html; charset=utf-8"}, content=PAGE_HTML)
+
+    original_client = web_loader._client
+    web_loader._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    try:
+        _, first = http_client.run_sync(web_loader.afetch_page(url), timeout=10)
+        entry = http_cache.lookup(url)
+        assert entry is not None and entry["etag"] == '"v1"', "❌ 失败: 带 ETag 的响应未写入缓存"
+        assert entry["body"] == PAGE_HTML and entry["encoding"] == "utf-8", "❌ 失败: 缓存的页面或编码不正确"
+
+        _, second = http_client.run_sync(web_loader.afetch_page(url), timeout=10)
+        assert len(requests_seen) == 2, "❌ 失败: 第二次抓取未联网确认"
+        assert requests_seen[1].headers.get("If-None-Match") == '"v1"', "❌ 失败: 未发送条件请求头"
+        assert first == second and "证监会发布减持新规" in second, "❌ 失败: 304 时未复用本地页面"
+    finally:
+        http_client.run_sync(web_loader._client.aclose(), timeout=5)
+        web_loader._client = original_client
+    print("✅ 条件请求 304 复用本地页面正常")
+
+
+def test_store_requires_validators():
+    """源站未提供 ETag / Last-Modified 的响应不缓存；Last-Modified 生成 If-Modified-Since"""
+    url = f"https://www.gov.cn/test/{os.getpid()}-{time.time_ns()}"
+    http_cache.store(url, {"Content-Type": "text/html"}, PAGE_HTML)
+    assert http_cache.lookup(url) is None, "❌ 失败: 无校验头的响应被缓存"
+
+    modified = "Wed, 22 May 2024 08:00:00 GMT"
+    http_cache.store(url, {"Last-Modified": modified}, PAGE_HTML)
+    assert http_cache.validator_headers(http_cache.lookup(url)) == {"If-Modified-Since": modified}
+    assert http_cache.validator_headers(None) == {}
+    print("✅ 缓存写入条件与条件请求头正常")
+
+
+def test_disk_cache_max_bytes_evicts_least_recently_used():
+    """超出 max_bytes 时淘汰最久未用的条目：命中会顺延有效期，因此最近读取过的条目保留"""
+    with tempfile.TemporaryDirectory() as tmp:
+        # 随机字节不可压缩，每条约 1000 字节 (压缩后)，上限可容纳 3 条
+        cache = DiskCache(os.path.join(tmp, "bounded.sqlite"), ttl=60, max_bytes=3500)
+        cache.set("a", os.urandom(1000))
+        time.sleep(0.01)
+        cache.set("b", os.urandom(1000))
+        time.sleep(0.01)
+        cache.get("a")  # a 变为最近使用
+        time.sleep(0.01)
+        cache.set("c", os.urandom(1000))
+        cache.set("d", os.urandom(1000))
+        kept = [k for k in "abcd" if cache.get(k) is not None]
+        assert kept == ["a", "c", "d"], f"❌ 失败: 淘汰顺序错误，保留了 {kept}"
+
+        # 未设置 max_bytes 的缓存不做淘汰
+        unbounded = DiskCache(os.path.join(tmp, "unbounded.sqlite"), ttl=60)
+        for k in "abcd":
+            unbounded.set(k, os.urandom(1000))
+        assert all(unbounded.get(k) is not None for k in "abcd"), "❌ 失败: 无容量上限的缓存发生了淘汰"
+    print("✅ DiskCache 容量上限与 LRU 淘汰正常")
+
+
+if __name__ == "__main__":
+    test_conditional_get_reuses_cached_body()
+    test_store_requires_validators()
+    test_disk_cache_max_bytes_evicts_least_recently_used()
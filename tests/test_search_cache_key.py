@@ -0,0 +1,33 @@
+import sys
+import os
+import tempfile
+
+# ---------------------------------------------------------
+# 环境设置：确保能导入 app 模块 (Streamlit 以 bare 模式执行页面脚本，不发起检索)
+# ---------------------------------------------------------
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault("DASHSCOPE_API_KEY", "offline-test")
+os.environ.setdefault("CACHE_DIR", tempfile.mkdtemp(prefix="policy_cache_"))
+
+try:
+    from app import _search_cache_key
+except ImportError as e:
+    print(f"❌ 错误: 无法导入 app 模块 ({e})。请确保目录结构正确且依赖已安装。")
+    sys.exit(1)
+
+
+def test_search_cache_key():
+    """会话检索缓存键：与词序、大小写、多余空白无关；检索词不同时键不同"""
+    key = _search_cache_key("减持新规 ETF")
+
+    assert key == _search_cache_key("ETF 减持新规"), "❌ 失败: 词序不同的查询未共用缓存键"
+    assert key == _search_cache_key("  etf   减持新规 "), "❌ 失败: 大小写或空白不同的查询未共用缓存键"
+    assert key != _search_cache_key("减持新规 LOF"), "❌ 失败: 不同查询共用了缓存键"
+    # 按空白分词：连写与分写视为不同查询
+    assert key != _search_cache_key("减持新规ETF"), "❌ 失败: 分词前后的查询共用了缓存键"
+    assert len(key) == 16 and int(key, 16) >= 0, "❌ 失败: 缓存键应为 8 字节十六进制摘要"
+    print("✅ 检索缓存键正常")
+
+
+if __name__ == "__main__":
+    test_search_cache_key()